@@ -0,0 +1,62 @@
+"""Compares the per-message cost of the old str.replace loops in czymamy
+with the compiled phrase matcher. Run with `python -m mariusz.bench_gnujdb`.
+"""
+
+import argparse
+import timeit
+
+import mariusz.gnujdb
+
+MESSAGES = [
+    "Mamy może w hs-ie nożyce do metalu?",
+    "Czy jest w hs miarka?",
+    "Mamy może miarkę w spejsie?",
+    "Czy mamy jakiś oscyloskop w hackerspejsie? Bo by się przydał.",
+    "Mamy może czas na to?",
+    "Czy jest na to czas?",
+    "Czy jest w hs miarka ",
+    "Czy ktoś będzie dzisiaj w spejsie?",
+]
+
+
+def old_czymamy(message: str) -> str | None:
+    """czymamy() as it was before the phrases were compiled."""
+    url = None
+    text = message.lower().split("?")[0].strip()
+    hsl_phrases = mariusz.gnujdb.HSL_PHRASES
+    if "?" in message and any((x in text for x in hsl_phrases)):
+        for item in mariusz.gnujdb.TRIGGERS:
+            text = text.replace(item, "")
+        for item in hsl_phrases:
+            text = text.replace(item, "")
+        for item in mariusz.gnujdb.NULL_PHRASES:
+            text = text.replace(item, "")
+        url = mariusz.gnujdb.search_url(text.strip())
+    return url
+
+
+def main() -> None:
+    """Prints messages/second for both implementations."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    def replace_loops():
+        for message in MESSAGES:
+            old_czymamy(message)
+
+    def compiled():
+        for message in MESSAGES:
+            mariusz.gnujdb.czymamy(message)
+
+    for name, func in (
+        ("str.replace loops", replace_loops),
+        ("compiled", compiled),
+    ):
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=3))
+        rate = args.number * len(MESSAGES) / elapsed
+        print(f"{name:>18}: {rate:>9.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
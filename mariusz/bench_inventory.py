@@ -0,0 +1,109 @@
+"""Measures loading and querying the inventory index on a synthetic
+inventory. Run with `python -m mariusz.bench_inventory`."""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from mariusz.inventory import Inventory
+
+NOUNS = [
+    "miarka",
+    "lutownica",
+    "nożyce",
+    "wkrętarka",
+    "multimetr",
+    "oscyloskop",
+    "zasilacz",
+    "kabel",
+    "śrubokręt",
+    "piła",
+    "wiertło",
+    "klucz",
+    "płytka",
+    "dioda",
+    "rezystor",
+    "kondensator",
+]
+ADJECTIVES = [
+    "zwijana",
+    "elektryczna",
+    "laboratoryjny",
+    "płaski",
+    "krzyżakowy",
+    "stalowe",
+    "długi",
+    "czerwona",
+    "mała",
+    "duży",
+]
+QUERIES = [
+    "miarkę",
+    "lutownicę",
+    "nożyce do metalu",
+    "zasilacz laboratoryjny",
+    "śrubokręt krzyżakowy",
+    "pickit 2",
+    "czerwoną diodę",
+    "kondensatory",
+]
+
+
+def write_dump(fname: str, size: int, seed: int = 0) -> None:
+    """Writes a dump with `size` random items."""
+    rng = random.Random(seed)
+    with open(fname, "w", encoding="utf-8") as f:
+        for i in range(size):
+            name = f"{rng.choice(NOUNS)} {rng.choice(ADJECTIVES)} {i}"
+            item = {"id": i, "name": name, "description": rng.choice(NOUNS)}
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def main() -> None:
+    """Prints load time and query latencies."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dump = os.path.join(tmpdir, "dump.jsonl")
+        write_dump(dump, args.items)
+        inventory = Inventory(os.path.join(tmpdir, "index.sqlite"))
+
+        started = time.perf_counter()
+        inventory.load(dump)
+        print(f"initial load: {time.perf_counter() - started:.2f}s")
+
+        with open(dump, "a", encoding="utf-8") as f:
+            for i in range(args.items, args.items + args.items // 100):
+                f.write(json.dumps({"id": i, "name": f"nowy {i}"}) + "\n")
+        started = time.perf_counter()
+        changed = inventory.load(dump)
+        elapsed = time.perf_counter() - started
+        print(f"reload with {changed} changes: {elapsed:.2f}s")
+
+        started = time.perf_counter()
+        inventory.load(dump)
+        print(f"reload, no changes: {time.perf_counter() - started:.4f}s")
+
+        latencies = []
+        for _ in range(args.number):
+            for query in QUERIES:
+                started = time.perf_counter()
+                inventory.search(query)
+                latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"search over {len(inventory)} items:")
+        print(f"  p50 {p50:.2f}ms, p99 {p99:.2f}ms")
+        inventory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Replays a synthetic stream of updates through the bot, against an
+in-process fake of the Telegram Bot API and local stand-ins for meetup.com,
+the wiki feed and Mumble. Reports throughput, reply latency and API calls
+per update. Run with `python -m mariusz.bench_replay`.
+
+Exits with an error if the results are worse than the limits given on the
+command line, so that it can guard against regressions in CI."""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+import meetupscraper
+import telegram
+
+import mariusz.broadcast
+import mariusz.fakes
+import mariusz.httpd
+import mariusz.main
+import mariusz.meetup
+import mariusz.text
+import mariusz.wiki
+
+MESSAGES = [
+    ".wersja",
+    "Łódź to piękne miasto",
+    "Lodz",
+    "no to jeszcze jak",
+    ".czy będzie padać?",
+    "Czy mamy w hs-ie lutownicę?",
+    ".corobic",
+    "Cześć, ktoś będzie dzisiaj w spejsie?",
+    "xD",
+    "https://example.com/jakis/link",
+]
+
+
+class FakeBot(mariusz.fakes.FakeBot):
+    """Answers API calls after `latency` seconds; every
+    `retry_after_every`-th call fails with RetryAfter instead.
+
+    Reply latency is measured from the moment an update is handed out by
+    get_updates() to the moment a message is sent to its chat; replies in a
+    chat are sent in order, so they're matched with updates first in, first
+    out."""
+
+    def __init__(self, latency: float = 0.02, retry_after_every: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.poll_wait = latency
+        self.retry_after_every = retry_after_every
+        self.expected: dict[int, int] = {}
+        self.arrivals: dict[int, collections.deque[float]] = {}
+        self.latencies: list[float] = []
+        self.lost = 0
+
+    def expect(self, updates: list[telegram.Update], replies: list[int]):
+        """Queues updates along with how many replies each should get."""
+        self.queue(updates)
+        for update, count in zip(updates, replies):
+            self.expected[update.update_id] = count
+
+    async def _call(self, method: str, chat_id: int | None = None) -> None:
+        await super()._call(method, chat_id)
+        count = sum(self.calls.values())
+        if self.retry_after_every and count % self.retry_after_every == 0:
+            self.calls["RetryAfter"] += 1
+            arrivals = self.arrivals.get(chat_id)  # type: ignore[arg-type]
+            if method == "send_message" and arrivals:
+                arrivals.popleft()
+                self.lost += 1
+            raise telegram.error.RetryAfter(1)
+        await asyncio.sleep(self.latency)
+
+    async def get_updates(self, offset=None, **kwargs):
+        batch = await super().get_updates(offset, **kwargs)
+        now = time.perf_counter()
+        for update in batch:
+            chat_id = update.message.chat_id
+            arrivals = self.arrivals.setdefault(chat_id, collections.deque())
+            arrivals.extend([now] * self.expected[update.update_id])
+        return batch
+
+    async def send_message(self, chat_id, text, **kwargs):
+        message = await super().send_message(chat_id, text, **kwargs)
+        arrivals = self.arrivals.get(chat_id)
+        if arrivals:
+            self.latencies.append(time.perf_counter() - arrivals.popleft())
+        return message
+
+
+def synthetic_updates(
+    bot: FakeBot, count: int, chats: int, seed: int = 0
+) -> list[telegram.Update]:
+    """Random messages from MESSAGES, spread over `chats` group chats."""
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = -1000 - rng.randrange(chats)
+        data = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000 + update_id,
+                "chat": {"id": chat_id, "type": "supergroup", "title": "HS"},
+                "from": {"id": 42, "is_bot": False, "first_name": "Ala"},
+                "text": rng.choice(MESSAGES),
+            },
+        }
+        updates.append(telegram.Update.de_json(data, bot))  # type: ignore
+    return updates
+
+
+def percentile(values: list[float], q: float) -> float:
+    """The q-th percentile (0-100) of the values."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+class FakeMumble(asyncio.DatagramProtocol):
+    """Answers pings like a Mumble server with `users` users online."""
+
+    def __init__(self) -> None:
+        self.users = 1
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        reply = struct.pack(">I8sIII", 0x10204, data[4:12], self.users, 100, 1)
+        assert self.transport is not None
+        self.transport.sendto(reply, addr)
+
+
+def wiki_feed(changes: int) -> bytes:
+    """An Atom feed with `changes` entries, newest first."""
+    entries = "".join(
+        f"<entry><id>tag:github.com,2008:Grit::Commit/c{i}</id>"
+        '<link href="https://github.com/hakierspejs/wiki/wiki/'
+        f'Strona-{i}"/><updated>2024-01-01T10:{i % 60:02}:00Z</updated>'
+        "<author><name>ala</name></author></entry>"
+        for i in range(changes, 0, -1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+    ).encode()
+
+
+async def replay(bot: FakeBot, bot_instance, args) -> dict[str, float]:
+    """Feeds the updates through handle_messages() until all the replies
+    are sent."""
+    updates = synthetic_updates(bot, args.messages, args.chats)
+    replies = [
+        len(bot_instance.reactions.matching(mariusz.text.fold(text)))
+        for text in (u.message.text for u in updates)
+    ]
+    bot.expect(updates, replies)
+    started = time.perf_counter()
+    while (bot_instance.update_id or 0) <= updates[-1].update_id:
+        await bot_instance.handle_messages()
+    await bot_instance.workers.join()
+    elapsed = time.perf_counter() - started
+    calls = sum(bot.calls.values())
+    return {
+        "updates/s": len(updates) / elapsed,
+        "replies": len(bot.latencies),
+        "latency p50 ms": percentile(bot.latencies, 50) * 1000,
+        "latency p95 ms": percentile(bot.latencies, 95) * 1000,
+        "latency p99 ms": percentile(bot.latencies, 99) * 1000,
+        "API calls/update": calls / len(updates),
+        "lost replies": bot.lost,
+    }
+
+
+async def periodic_jobs(
+    bot: FakeBot, bot_instance
+) -> tuple[dict[str, tuple], dict[str, float]]:
+    """Runs each periodic job against the stand-ins. Returns job ->
+    (seconds, API calls), and how many notifications were queued, sent and
+    expected to be sent: a combined wiki message and a Mumble one for each
+    chat."""
+    results = {}
+
+    async def measure(name, func):
+        calls = sum(bot.calls.values())
+        started = time.perf_counter()
+        result = await func()
+        elapsed = time.perf_counter() - started
+        results[name] = (elapsed, sum(bot.calls.values()) - calls)
+        return result
+
+    event = meetupscraper.Event(
+        url="https://meetup.com/e/1",
+        date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=2),
+        title="Hakierspejs",
+        venue=meetupscraper.Venue(name="Online event", street=""),
+    )
+    bot_instance.meetup = mariusz.meetup.MeetupRefresher(
+        None, fetch=lambda regex: [event]
+    )
+    await bot_instance.meetup.refresh()
+    await measure("meetup (pin)", bot_instance.maybe_update_meetup_message)
+    await measure(
+        "meetup (no change)", bot_instance.maybe_update_meetup_message
+    )
+
+    feed = {"changes": 1}
+
+    async def github(request):
+        return mariusz.httpd.Response(body=wiki_feed(feed["changes"]))
+
+    server = await mariusz.httpd.serve(github, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    sources = bot_instance.sources
+    sources.wiki = mariusz.wiki.WikiWatcher(
+        f"http://127.0.0.1:{port}/wiki.atom"
+    )
+    await bot_instance.maybe_update_wiki()  # remembers where history ends
+    feed["changes"] = 6
+    await measure("wiki (5 changes)", bot_instance.maybe_update_wiki)
+    await sources.wiki.aclose()
+    server.close()
+
+    loop = asyncio.get_running_loop()
+    transport, mumble = await loop.create_datagram_endpoint(
+        FakeMumble, local_addr=("127.0.0.1", 0)
+    )
+    sources.mumble_server = "127.0.0.1"
+    sources.mumble_port = transport.get_extra_info("sockname")[1]
+    await bot_instance.maybe_update_mumble()  # baseline
+    mumble.users = 3
+    bot_instance.mumble_last_update = 0
+    await measure("mumble", bot_instance.maybe_update_mumble)
+    transport.close()
+
+    outbox = bot_instance.outbox
+    queued = len(outbox)
+    outbox.clock = lambda: time.time() + 3600  # everything is due
+    sent = await measure("outbox flush", outbox.flush)
+    chats = len(list(bot_instance.chat_db.list()))
+    return results, {
+        "queued": queued,
+        "sent": sent,
+        "expected": 2 * chats,
+    }
+
+
+async def run(args) -> dict[str, float]:
+    """Sets up the bot with the fakes, runs the benchmark and prints the
+    results."""
+    bot = FakeBot(args.latency, args.retry_after_every)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bot_instance = mariusz.main.Mariusz(
+            "0:bench",
+            os.path.join(tmpdir, "chats.sqlite"),
+            None,
+            bot=bot,  # type: ignore[arg-type]
+        )
+        if not args.rate_limits:
+            broadcaster = mariusz.broadcast.Broadcaster(
+                bot,  # type: ignore[arg-type]
+                global_rate=1e9,
+                private_chat_rate=1e9,
+                group_chat_rate=1e9,
+            )
+            bot_instance.broadcaster = broadcaster
+            bot_instance.outbox.broadcaster = broadcaster
+        results = await replay(bot, bot_instance, args)
+        print(f"{args.messages} updates in {args.chats} chats:")
+        for key, value in results.items():
+            print(f"  {key:>18}: {value:.2f}")
+        print("periodic jobs:")
+        jobs, notifications = await periodic_jobs(bot, bot_instance)
+        for name, (elapsed, calls) in jobs.items():
+            print(f"  {name:>18}: {elapsed * 1000:8.1f}ms, {calls} API calls")
+        print("notifications:")
+        for key, value in notifications.items():
+            print(f"  {key:>18}: {value}")
+            results[f"notifications {key}"] = value
+        bot_instance.chat_db.close()
+    return results
+
+
+def main() -> None:
+    """Parses the arguments and checks the results against the limits."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="of each API call, in s"
+    )
+    parser.add_argument("--retry-after-every", type=int, default=0)
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="keep the real broadcast rate limits (makes jobs slow)",
+    )
+    parser.add_argument("--min-updates-per-second", type=float, default=0)
+    parser.add_argument("--max-calls-per-update", type=float, default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    failures = []
+    if results["updates/s"] < args.min_updates_per_second:
+        failures.append("updates/s below the limit")
+    max_calls = args.max_calls_per_update
+    if max_calls is not None and results["API calls/update"] > max_calls:
+        failures.append("API calls/update above the limit")
+    # Throughput means nothing if the notifications are lost on the way.
+    if results["notifications sent"] < results["notifications expected"]:
+        failures.append("notifications weren't sent")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measures how long it takes from starting the interpreter until the bot
+is ready to react to a message. Run with `python -m mariusz.bench_startup`.
+
+Each run is a fresh process, so nothing is cached in sys.modules; the
+network isn't touched."""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import mariusz.main
+imported = time.perf_counter()
+bot = mariusz.main.Mariusz("123:fake", sys.argv[1], None)
+bot.reactions.match(".wersja")
+ready = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "init": ready - imported,
+    "modules": sorted({m.split(".")[0] for m in sys.modules} & {
+        "meetupscraper", "lxml", "icalendar", "requests"}),
+}))
+"""
+
+
+def run_once(db_path: str) -> dict:
+    """Starts a fresh interpreter and returns its timings."""
+    env = dict(os.environ, MAIN_CHAT_ID="-1")
+    started = time.perf_counter()
+    out = subprocess.check_output(
+        [sys.executable, "-c", CHILD, db_path], env=env, text=True
+    )
+    result = json.loads(out)
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+def main() -> None:
+    """Prints median startup timings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "chats.sqlite")
+        results = [run_once(db_path) for _ in range(args.runs)]
+    for key in ("import", "init", "total"):
+        median = statistics.median(r[key] for r in results)
+        print(f"{key:>8}: {median * 1000:7.1f}ms")
+    heavy = results[-1]["modules"]
+    print(f"heavy modules loaded at startup: {', '.join(heavy) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
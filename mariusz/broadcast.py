@@ -0,0 +1,230 @@
+"""Sends messages to many chats at once without tripping Telegram's flood
+control."""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+import telegram
+
+import mariusz.metrics
+
+LOGGER = logging.getLogger(__name__)
+
+# https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+GLOBAL_RATE = 30.0  # messages per second, all chats together
+PRIVATE_CHAT_RATE = 1.0  # messages per second in a single chat
+GROUP_CHAT_RATE = 20.0 / 60.0  # messages per second in a single group
+
+
+class TokenBucket:
+    """Allows `rate` operations per second on average, with bursts of up to
+    `capacity` operations."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Takes a token if there is one and returns zero. Otherwise returns
+        the number of seconds until a token becomes available."""
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        """Gives back a token taken by try_take() that wasn't used."""
+        self.tokens = min(self.capacity, self.tokens + 1.0)
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and takes it."""
+        while delay := self.try_take():
+            await asyncio.sleep(delay)
+
+
+def retry_after_seconds(error: telegram.error.RetryAfter) -> float:
+    """Returns RetryAfter.retry_after in seconds, whichever type the
+    installed python-telegram-bot uses for it."""
+    value = error.retry_after
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+@dataclasses.dataclass
+class Delivery:
+    """The outcome of a broadcast in a single chat."""
+
+    chat_id: int
+    result: Any = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Tells whether the action succeeded in this chat."""
+        return self.error is None
+
+
+@dataclasses.dataclass
+class BroadcastReport:
+    """Per-chat outcomes of a broadcast."""
+
+    deliveries: list[Delivery]
+    duration: float
+
+    @property
+    def sent(self) -> list[Delivery]:
+        """Deliveries that succeeded."""
+        return [d for d in self.deliveries if d.ok]
+
+    @property
+    def failed(self) -> list[Delivery]:
+        """Deliveries that ended with an error."""
+        return [d for d in self.deliveries if not d.ok]
+
+
+class Broadcaster:
+    """Runs an action in many chats concurrently. Every Bot API call goes
+    through call(), which respects the global and per-chat rate limits and
+    retries after flood control kicks in."""
+
+    def __init__(
+        self,
+        bot: telegram.Bot,
+        concurrency: int = 8,
+        max_retries: int = 3,
+        global_rate: float = GLOBAL_RATE,
+        private_chat_rate: float = PRIVATE_CHAT_RATE,
+        group_chat_rate: float = GROUP_CHAT_RATE,
+        metrics: mariusz.metrics.Registry | None = None,
+    ) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.paused_until = 0.0
+        metrics = metrics or mariusz.metrics.Registry()
+        self.duration = metrics.histogram(
+            "mariusz_broadcast_seconds", "How long broadcasts take."
+        )
+        self.deliveries = metrics.counter(
+            "mariusz_broadcast_deliveries_total",
+            "Per-chat outcomes of broadcasts.",
+        )
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_chat_rate, capacity=3.0)
+            else:
+                bucket = TokenBucket(self.private_chat_rate)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def call(
+        self,
+        method: Callable[..., Awaitable[Any]],
+        *,
+        chat_id: int,
+        per_chat: bool = True,
+        **kwargs: Any,
+    ) -> Any:
+        """Calls a Bot API method in a chat, i.e. method(chat_id=chat_id,
+        **kwargs). Set per_chat to False for calls that don't post anything
+        to the chat (e.g. get_chat)."""
+        for attempt in range(self.max_retries + 1):
+            while (delay := self.paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            if per_chat:
+                await self._chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await method(chat_id=chat_id, **kwargs)
+            except telegram.error.RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                # Flood control applies to the whole bot, so everybody waits.
+                delay = retry_after_seconds(e)
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + delay
+                )
+                LOGGER.warning(
+                    "Broadcaster: flood control in chat %d, pausing %.0fs",
+                    chat_id,
+                    delay,
+                )
+        raise AssertionError("unreachable")
+
+    async def run(
+        self,
+        chat_ids: Iterable[int],
+        action: Callable[[int], Awaitable[Any]],
+    ) -> BroadcastReport:
+        """Runs action(chat_id) for every chat, at most `concurrency` of them
+        at a time. Errors are recorded in the report instead of being
+        raised."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def deliver(chat_id: int) -> Delivery:
+            async with semaphore:
+                try:
+                    return Delivery(chat_id, result=await action(chat_id))
+                except telegram.error.TelegramError as e:
+                    LOGGER.warning("Broadcaster: chat %d: %r", chat_id, e)
+                    return Delivery(chat_id, error=e)
+                except Exception as e:  # pylint: disable=broad-except
+                    LOGGER.exception("Broadcaster: chat %d", chat_id)
+                    return Delivery(chat_id, error=e)
+
+        deliveries = await asyncio.gather(*map(deliver, chat_ids))
+        report = BroadcastReport(deliveries, time.monotonic() - started)
+        self.duration.observe(report.duration)
+        self.deliveries.inc(len(report.sent), result="sent")
+        self.deliveries.inc(len(report.failed), result="failed")
+        LOGGER.info(
+            "Broadcaster: %d sent, %d failed in %.1fs",
+            len(report.sent),
+            len(report.failed),
+            report.duration,
+        )
+        return report
+
+    async def send_message(
+        self, chat_ids: Iterable[int], text: str, **kwargs: Any
+    ) -> BroadcastReport:
+        """Sends the same message to all the given chats."""
+
+        async def send(chat_id: int) -> telegram.Message:
+            return await self.call(
+                self.bot.send_message,
+                chat_id=chat_id,
+                text=text,
+                **kwargs,
+            )
+
+        return await self.run(chat_ids, send)
@@ -0,0 +1,251 @@
+"""Persistent registry of the chats that the bot ever spoke with."""
+
+import dataclasses
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Generator
+
+LOGGER = logging.getLogger(__name__)
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA
+# user_version), so existing databases are migrated on startup.
+MIGRATIONS = [
+    # 1: one row per chat, keyed by the integer chat ID.
+    """
+    CREATE TABLE IF NOT EXISTS chat_ids (chat_id TEXT);
+    CREATE TABLE chats (chat_id INTEGER PRIMARY KEY);
+    INSERT OR IGNORE INTO chats(chat_id)
+        SELECT DISTINCT CAST(chat_id AS INTEGER) FROM chat_ids;
+    DROP TABLE chat_ids;
+    """,
+    # 2: chat metadata. Chats registered before we knew their type are
+    # classified by the sign of their ID, like the bot used to do.
+    """
+    ALTER TABLE chats ADD COLUMN type TEXT;
+    ALTER TABLE chats ADD COLUMN title TEXT;
+    ALTER TABLE chats ADD COLUMN last_seen REAL;
+    ALTER TABLE chats ADD COLUMN pinned_text TEXT;
+    ALTER TABLE chats ADD COLUMN pinned_message_id INTEGER;
+    UPDATE chats
+        SET type = CASE WHEN chat_id < 0 THEN 'group' ELSE 'private' END;
+    CREATE INDEX chats_type ON chats(type);
+    CREATE INDEX chats_last_seen ON chats(last_seen);
+    """,
+    # 3: bot state that has to survive restarts, e.g. the update offset.
+    """
+    CREATE TABLE state (key TEXT PRIMARY KEY, value);
+    """,
+    # 4: notifications waiting to be sent (see mariusz.outbox) and the last
+    # message sent to each chat.
+    """
+    CREATE TABLE outbox (
+        id INTEGER PRIMARY KEY,
+        chat_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        text TEXT NOT NULL,
+        due REAL NOT NULL
+    );
+    CREATE INDEX outbox_chat_kind ON outbox(chat_id, kind);
+    CREATE TABLE last_sent (chat_id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+    """,
+    # 5: updates whose reactions were interrupted by a shutdown, as JSON.
+    """
+    CREATE TABLE unfinished_updates (
+        update_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    """,
+]
+
+GROUP_TYPES = ("group", "supergroup")
+
+
+@dataclasses.dataclass
+class Chat:
+    """What we know about a chat."""
+
+    chat_id: int
+    type: str | None = None
+    title: str | None = None
+    last_seen: float | None = None
+    pinned_text: str | None = None
+    pinned_message_id: int | None = None
+
+
+class ChatDb:
+    """Collects a list of chats that the bot ever spoke with.
+
+    Chats are kept in memory; new chats and changes to the known ones are
+    written to SQLite in batches, once `batch_size` of them are pending or
+    the oldest pending one has waited `flush_interval` seconds (see
+    maybe_flush()). Queries that filter chats are answered by SQLite."""
+
+    def __init__(
+        self,
+        fname: str,
+        batch_size: int = 50,
+        flush_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.db = sqlite3.connect(fname)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.load_schema()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.chats = {
+            row[0]: Chat(*row)
+            for row in self.db.execute(
+                "SELECT chat_id, type, title, last_seen, pinned_text,"
+                " pinned_message_id FROM chats"
+            )
+        }
+        self.pending: set[int] = set()
+        self.pending_since = 0.0
+        row = self.db.execute(
+            "SELECT value FROM state WHERE key = 'update_offset'"
+        ).fetchone()
+        self.update_offset: int | None = row[0] if row else None
+        self.update_offset_dirty = False
+
+    def load_schema(self) -> None:
+        """Initializes the database by creating required entities and
+        migrating the ones created by older versions of the bot."""
+        (version,) = self.db.execute("PRAGMA user_version").fetchone()
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            LOGGER.info("ChatDb: migrating schema to version %d", number)
+            self.db.executescript(
+                f"BEGIN; {migration}; PRAGMA user_version = {number}; COMMIT;"
+            )
+
+    def _dirty(self) -> bool:
+        return bool(self.pending) or self.update_offset_dirty
+
+    def _changed(self, chat_id: int | None = None) -> None:
+        if not self._dirty():
+            self.pending_since = self.clock()
+        if chat_id is None:
+            self.update_offset_dirty = True
+        else:
+            self.pending.add(chat_id)
+        self.maybe_flush()
+
+    def set_update_offset(self, offset: int) -> None:
+        """Remembers the ID of the next update that the bot should process,
+        so that it can resume from there after a restart."""
+        if offset == self.update_offset:
+            return
+        self.update_offset = offset
+        self._changed()
+
+    def save_unfinished(self, updates: dict[int, str]) -> None:
+        """Stores updates (update ID -> JSON) whose reactions didn't finish,
+        so that they can be handled after a restart."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO unfinished_updates VALUES (?, ?)",
+                updates.items(),
+            )
+
+    def take_unfinished(self) -> list[str]:
+        """Returns the stored updates, oldest first, and forgets them."""
+        with self.db:
+            rows = self.db.execute(
+                "DELETE FROM unfinished_updates RETURNING update_id, data"
+            ).fetchall()
+        return [data for _, data in sorted(rows)]
+
+    def insert(
+        self,
+        chat_id: int,
+        chat_type: str | None = None,
+        title: str | None = None,
+        last_seen: float | None = None,
+    ) -> None:
+        """Inserts a chat into the set, or updates what we know about it."""
+        chat_id = int(chat_id)
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = Chat(chat_id)
+        chat.type = chat_type or chat.type
+        chat.title = title or chat.title
+        chat.last_seen = last_seen or time.time()
+        self._changed(chat_id)
+
+    def get(self, chat_id: int) -> Chat | None:
+        """Returns what we know about a chat."""
+        return self.chats.get(chat_id)
+
+    def set_pinned(self, chat_id: int, text: str, message_id: int) -> None:
+        """Remembers the meetup message that we pinned in a chat."""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = Chat(chat_id)
+        chat.pinned_text = text
+        chat.pinned_message_id = message_id
+        self._changed(chat_id)
+
+    def maybe_flush(self) -> None:
+        """Writes pending changes if there are enough of them or if they have
+        been waiting for too long."""
+        if not self._dirty():
+            return
+        too_many = len(self.pending) >= self.batch_size
+        too_old = self.clock() - self.pending_since >= self.flush_interval
+        if too_many or too_old:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all pending changes in a single transaction."""
+        if not self._dirty():
+            return
+        rows = [
+            dataclasses.astuple(self.chats[chat_id])
+            for chat_id in self.pending
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO chats(chat_id, type, title, last_seen,"
+                " pinned_text, pinned_message_id) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if self.update_offset_dirty:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO state(key, value)"
+                    " VALUES ('update_offset', ?)",
+                    (self.update_offset,),
+                )
+        self.update_offset_dirty = False
+        LOGGER.debug("ChatDb: flushed %d chats", len(self.pending))
+        self.pending.clear()
+
+    def close(self) -> None:
+        """Flushes pending writes and closes the database."""
+        self.flush()
+        self.db.close()
+
+    def _query(self, sql: str, *params: Any) -> list[int]:
+        self.flush()
+        return [row[0] for row in self.db.execute(sql, params)]
+
+    def groups(self) -> list[int]:
+        """Returns the IDs of group chats (as opposed to private ones)."""
+        return self._query(
+            "SELECT chat_id FROM chats WHERE type IN (?, ?) ORDER BY chat_id",
+            *GROUP_TYPES,
+        )
+
+    def active_since(self, days: float) -> list[int]:
+        """Returns the IDs of chats in which somebody wrote in the last
+        `days` days."""
+        return self._query(
+            "SELECT chat_id FROM chats WHERE last_seen >= ? ORDER BY chat_id",
+            time.time() - days * 86400,
+        )
+
+    def list(self) -> Generator[int, Any, None]:
+        """Generated a sequence of chats that the bot ever spoke with."""
+        yield from sorted(self.chats)
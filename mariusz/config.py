@@ -0,0 +1,69 @@
+"""Reads the configuration of several bots that run in one process.
+
+The file is TOML, with a [[bot]] table per bot. Keys are the same as the
+arguments of Mariusz, e.g.:
+
+    [[bot]]
+    api_key = "123:abc"
+    path_to_chat_db = "/dane/hakierspejs.sqlite"
+    main_chat_id = -1001234567890
+
+    [[bot]]
+    api_key = "456:def"
+    path_to_chat_db = "/dane/cryptoparty.sqlite"
+    main_chat_id = -1002119535581
+    group_regex = "Cryptoparty"
+
+Keys in an optional [defaults] table apply to every bot that doesn't set
+them itself."""
+
+import tomllib
+from typing import Any
+
+import mariusz.throttle
+
+REQUIRED = {"api_key", "path_to_chat_db", "main_chat_id"}
+OPTIONAL = {
+    "group_regex",
+    "webhook_url",
+    "webhook_listen",
+    "webhook_secret",
+    "metrics_listen",
+    "stall_threshold",
+    "inventory_dump",
+    "inventory_index",
+    "throttle_chat",
+    "throttle_user",
+    "profile_dir",
+}
+
+
+def parse(text: str) -> list[dict[str, Any]]:
+    """Returns the keyword arguments for each configured bot. Raises
+    ValueError if the configuration is incomplete or has unknown keys."""
+    data = tomllib.loads(text)
+    defaults = {
+        "throttle_chat": mariusz.throttle.CHAT_LIMIT,
+        "throttle_user": mariusz.throttle.USER_LIMIT,
+    } | data.get("defaults", {})
+    bots = [defaults | bot for bot in data.get("bot", [])]
+    if not bots:
+        raise ValueError("No [[bot]] tables in the configuration.")
+    for number, bot in enumerate(bots, 1):
+        unknown = set(bot) - REQUIRED - OPTIONAL
+        if unknown:
+            raise ValueError(f"Bot #{number}: unknown keys {sorted(unknown)}")
+        missing = REQUIRED - set(bot)
+        if missing:
+            raise ValueError(f"Bot #{number}: missing keys {sorted(missing)}")
+    # Two pollers with the same token would steal each other's updates.
+    for key in ("api_key", "path_to_chat_db"):
+        if len({bot[key] for bot in bots}) < len(bots):
+            raise ValueError(f"Bots can't share the same {key}.")
+    return bots
+
+
+def load(path: str) -> list[dict[str, Any]]:
+    """Reads and parses the configuration file."""
+    with open(path, encoding="utf-8") as f:
+        return parse(f.read())
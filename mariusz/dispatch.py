@@ -0,0 +1,137 @@
+"""Matches incoming messages against all registered reactions at once."""
+
+import re
+from typing import Any, Callable, Coroutine, Iterator
+
+import telegram
+
+import mariusz.text
+
+Handler = Callable[[telegram.Update], Coroutine[Any, Any, None]]
+
+# Characters that make a pattern alternative something other than a plain
+# literal. Alternatives containing any of them go to the regex fallback.
+_REGEX_METACHARACTERS = frozenset(".^$*+?{}[]|()\\")
+
+
+def _fold_trigger(trigger: str) -> str:
+    if _REGEX_METACHARACTERS & set(trigger.replace("\\.", "")):
+        # Lowercasing would turn e.g. \S into \s; the pattern is compiled
+        # with re.IGNORECASE anyway.
+        return mariusz.text.strip_diacritics(trigger)
+    return mariusz.text.fold(trigger)
+
+
+def compile_triggers(text: set[str]) -> re.Pattern[str]:
+    """Builds the pattern that Mariusz.on() registers for a set of triggers.
+    Triggers are folded (see mariusz.text.fold()), so the pattern matches
+    folded messages; "Łódź" and "Lodz" become the same trigger. Triggers
+    that are regexes only lose their diacritics. Commands (starting with an
+    escaped dot) are anchored to the beginning of the message."""
+    folded = {_fold_trigger(x) for x in text}
+    regex_str = "|".join(
+        sorted("^" + x if x.startswith("\\.") else x for x in folded)
+    )
+    return re.compile(regex_str, flags=re.IGNORECASE)
+
+
+def _as_literals(pattern: str) -> list[str] | None:
+    """Returns the plain-text prefixes that the pattern matches, or None if
+    the pattern uses regex features other than `^`, `|` and `\\.`."""
+    literals = []
+    for alternative in pattern.split("|"):
+        alternative = alternative.removeprefix("^").replace("\\.", "\0")
+        if not alternative or _REGEX_METACHARACTERS & set(alternative):
+            return None
+        literals.append(mariusz.text.fold(alternative.replace("\0", ".")))
+    return literals
+
+
+class _TrieNode:
+    __slots__ = ("children", "reactions")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.reactions: list[int] = []
+
+
+class Dispatcher:
+    """An ordered table of reactions. Behaves like the dictionary it replaces
+    (pattern -> handler), but finds every matching handler in a single scan
+    of the message instead of trying each pattern in turn.
+
+    Patterns that are alternations of plain literals (all of the triggers
+    we have) are stored in a prefix trie; anything else is folded into one
+    combined regex with a named group per reaction."""
+
+    def __init__(self) -> None:
+        self._reactions: dict[re.Pattern[str], Handler] = {}
+        self._matches: list[tuple[re.Pattern[str], Handler]] = []
+        self._trie: _TrieNode | None = None
+        self._combined: re.Pattern[str] | None = None
+
+    def __setitem__(self, regex: re.Pattern[str], handler: Handler) -> None:
+        self._reactions[regex] = handler
+        self._trie = None
+
+    def __getitem__(self, regex: re.Pattern[str]) -> Handler:
+        return self._reactions[regex]
+
+    def __len__(self) -> int:
+        return len(self._reactions)
+
+    def __iter__(self) -> Iterator[re.Pattern[str]]:
+        return iter(self._reactions)
+
+    def items(self):
+        """Same as dict.items(), in registration order."""
+        return self._reactions.items()
+
+    def _build(self) -> _TrieNode:
+        trie = _TrieNode()
+        fallback = []
+        self._matches = list(self._reactions.items())
+        for index, regex in enumerate(self._reactions):
+            literals = _as_literals(regex.pattern)
+            if literals is None:
+                fallback.append(f"(?=(?P<r{index}>{regex.pattern}))?")
+                continue
+            for literal in literals:
+                node = trie
+                for char in literal:
+                    node = node.children.setdefault(char, _TrieNode())
+                if index not in node.reactions:
+                    node.reactions.append(index)
+        self._combined = (
+            re.compile("".join(fallback), flags=re.IGNORECASE)
+            if fallback
+            else None
+        )
+        self._trie = trie
+        return trie
+
+    def match(self, text: str) -> list[Handler]:
+        """Returns handlers of all reactions whose pattern matches the
+        beginning of the text, in the order they were registered. The text
+        should already be folded with mariusz.text.fold()."""
+        return [handler for _, handler in self.matching(text)]
+
+    def matching(self, text: str) -> list[tuple[re.Pattern[str], Handler]]:
+        """Like match(), but returns (pattern, handler) pairs."""
+        trie = self._trie or self._build()
+        matched = set()
+        node = trie
+        for char in text:
+            node = node.children.get(char)  # type: ignore[assignment]
+            if node is None:
+                break
+            matched.update(node.reactions)
+        if self._combined is not None:
+            m = self._combined.match(text)
+            if m:
+                matched.update(
+                    int(name[1:])
+                    for name, value in m.groupdict().items()
+                    if value is not None
+                )
+        return [self._matches[index] for index in sorted(matched)]
@@ -0,0 +1,91 @@
+"""In-process stand-ins for telegram.Bot and the clock, shared by the
+tests and the benchmarks."""
+
+import asyncio
+import collections
+import datetime
+import itertools
+
+import telegram
+
+
+class FakeClock:
+    """A clock for the `clock` arguments that only moves when told to."""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Serves queued updates from get_updates() and records the messages
+    sent and the API calls made."""
+
+    def __init__(self) -> None:
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.updates: list[telegram.Update] = []
+        self.sent: list[tuple[int, str]] = []
+        self.message_ids = itertools.count(1)
+        # How long get_updates() waits when there's nothing new, so that
+        # polling doesn't spin.
+        self.poll_wait = 0.001
+
+    async def _call(self, method: str, chat_id: int | None = None) -> None:
+        self.calls[method] += 1
+
+    def queue(self, updates: list[telegram.Update]) -> None:
+        """Makes the updates available to get_updates()."""
+        self.updates.extend(updates)
+
+    def receive(
+        self, update_id: int, text: str, chat_id: int, user_id: int = 42
+    ) -> telegram.Update:
+        """Queues a text message in a group chat and returns its update."""
+        data = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000 + update_id,
+                "chat": {"id": chat_id, "type": "supergroup", "title": "HS"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Ala"},
+                "text": text,
+            },
+        }
+        update = telegram.Update.de_json(data, self)  # type: ignore
+        self.queue([update])
+        return update
+
+    async def get_updates(self, offset=None, **kwargs):
+        self.calls["get_updates"] += 1
+        first = self.updates[0].update_id if self.updates else 0
+        start = max((offset or first) - first, 0)
+        batch = self.updates[start:][:100]
+        if not batch:
+            await asyncio.sleep(self.poll_wait)
+        return batch
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message", chat_id)
+        self.sent.append((chat_id, text))
+        return telegram.Message(
+            next(self.message_ids),
+            datetime.datetime.now(datetime.timezone.utc),
+            telegram.Chat(chat_id, "supergroup"),
+            text=text,
+        )
+
+    async def get_chat(self, chat_id, **kwargs):
+        await self._call("get_chat")
+        return telegram.ChatFullInfo(
+            chat_id, "supergroup", accent_color_id=0, max_reaction_count=0
+        )
+
+    async def pin_chat_message(self, **kwargs):
+        await self._call("pin_chat_message")
+        return True
+
+    async def unpin_chat_message(self, **kwargs):
+        await self._call("unpin_chat_message")
+        return True
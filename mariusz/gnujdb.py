@@ -1,6 +1,6 @@
+import re
 import urllib.parse
 
-
 TRIGGERS = {
     "jest moze",
     "jest może",
@@ -13,26 +13,76 @@ TRIGGERS = {
 }
 
 
+HSL_PHRASES = (
+    "w spejse",
+    "w spejsie",
+    "w hackerspejsie",
+    "w hs-ie",
+    "w hs",
+    "w hsie",
+)
+
+NULL_PHRASES = ("jakiś", "jakis", "może", "moze", "mamy")
+
+SEARCH_URL = "https://g.hs-ldz.pl/search?query="
+
+
+def _trie_regex(phrases) -> str:
+    """Builds a regex matching any of the phrases, with common prefixes
+    factored out (e.g. "w (?:hs(?:-ie|ie)?|spejs(?:e|ie))"), so that the
+    engine doesn't retry every phrase at every position. Optional tails
+    are greedy, so the longest phrase wins."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alternatives = [
+            re.escape(c) + build(node[c]) for c in sorted(node) if c
+        ]
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and "" not in node:
+            return alternatives[0]
+        regex = "(?:" + "|".join(alternatives) + ")"
+        return regex + "?" if "" in node else regex
+
+    return build(trie)
+
+
+# Phrases naming the hackerspace are captured, so that splitting a message
+# on this regex tells in a single pass both whether the hackerspace was
+# mentioned and what's left once all the phrases are gone. \b keeps e.g.
+# "w hs" from matching the beginning of "w hsbc".
+_PHRASES = re.compile(
+    rf"\b(?:({_trie_regex(HSL_PHRASES)})"
+    rf"|{_trie_regex(TRIGGERS | set(NULL_PHRASES))})\b"
+)
+
+
+def extract_query(message: str) -> str | None:
+    """Returns what the message asks about if it's a question whether we
+    have something in the hackerspace."""
+    if "?" not in message:
+        return None
+    parts = _PHRASES.split(message.lower().split("?")[0])
+    if not any(parts[1::2]):
+        return None
+    return " ".join(" ".join(parts[::2]).split())
+
+
 def czymamy(message: str) -> str | None:
-    url = None
-    hsl_phrases = (
-        "w spejse",
-        "w spejsie",
-        "w hackerspejsie",
-        "w hs-ie",
-        "w hs",
-        "w hsie",
-    )
-    null_phrases = ("jakiś", "jakis", "może", "moze", "mamy")
-    text = message.lower().split("?")[0].strip()
-    if "?" in message and any((x in text for x in hsl_phrases)):
-        for item in TRIGGERS:
-            text = text.replace(item, "")
-        for item in hsl_phrases:
-            text = text.replace(item, "")
-        for item in null_phrases:
-            text = text.replace(item, "")
-        url = "https://g.hs-ldz.pl/search?query=" + urllib.parse.quote(
-            text.strip()
-        )
-    return url
+    """Returns a link to search results in our inventory for a question
+    whether we have something."""
+    query = extract_query(message)
+    if query is None:
+        return None
+    return search_url(query)
+
+
+def search_url(query: str) -> str:
+    """Link to search results for the query in our inventory."""
+    return SEARCH_URL + urllib.parse.quote(query)
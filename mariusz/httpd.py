@@ -0,0 +1,128 @@
+"""A tiny asyncio HTTP/1.1 server for the few local endpoints that the bot
+exposes. One request per connection, no keep-alive, no chunked bodies."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, NamedTuple
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+READ_TIMEOUT = 10.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Request(NamedTuple):
+    """A parsed HTTP request. Header names are lower-case."""
+
+    method: str
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+
+class Response(NamedTuple):
+    """What a handler answers with."""
+
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: tuple[tuple[str, str], ...] = ()
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class BadRequest(Exception):
+    """Raised when the client sent something we can't parse."""
+
+    def __init__(self, status: int = 400) -> None:
+        super().__init__(status)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader) -> Request:
+    """Reads a single request from the stream."""
+    try:
+        request_line = await reader.readline()
+        method, path, _version = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+    except ValueError as e:
+        raise BadRequest() from e
+    if length > MAX_BODY_SIZE:
+        raise BadRequest(413)
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise BadRequest() from e
+    return Request(method, path, headers, body)
+
+
+async def write_response(
+    writer: asyncio.StreamWriter, response: Response
+) -> None:
+    """Writes the response and closes the connection."""
+    reason = REASONS.get(response.status, "")
+    head = (
+        f"HTTP/1.1 {response.status} {reason}\r\n"
+        f"Content-Type: {response.content_type}\r\n"
+        f"Content-Length: {len(response.body)}\r\n"
+        + "".join(f"{name}: {value}\r\n" for name, value in response.headers)
+        + "Connection: close\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + response.body)
+    await writer.drain()
+    writer.close()
+
+
+async def serve(handler: Handler, host: str, port: int) -> asyncio.Server:
+    """Starts serving requests with the given handler in the background."""
+
+    async def on_connection(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            try:
+                request = await asyncio.wait_for(
+                    read_request(reader), READ_TIMEOUT
+                )
+                response = await handler(request)
+            except BadRequest as e:
+                response = Response(e.status)
+            except asyncio.TimeoutError:
+                response = Response(400)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("httpd: handler failed")
+                response = Response(500)
+            await write_response(writer, response)
+        except ConnectionError as e:
+            LOGGER.debug("httpd: %r", e)
+
+    return await asyncio.start_server(on_connection, host, port)
+
+
+def parse_address(address: str, default_port: int) -> tuple[str, int]:
+    """Splits "host:port", "host" or "port" into a (host, port) tuple."""
+    host, sep, port = address.rpartition(":")
+    if sep:
+        return host, int(port)
+    if address.isdigit():
+        return "127.0.0.1", int(address)
+    return address, default_port
@@ -0,0 +1,188 @@
+"""A local full-text index of the hackerspace's inventory, so that "czy
+mamy" questions can be answered without asking g.hs-ldz.pl."""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Iterator, NamedTuple
+
+import mariusz.text
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    url TEXT,
+    digest TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(terms);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value);
+"""
+
+# Words that say nothing about what's being looked for. An item matching
+# only one of them (or a word shorter than 3 letters) isn't worth showing.
+STOP_WORDS = (
+    "albo bez co cos czy dla do i jak jaki jakis jest ktory lub ma mamy"
+    " moze na nad nie od po pod przy sie ta tak tam ten to w we z ze"
+)
+_STOP_TERMS = frozenset(mariusz.text.search_terms(STOP_WORDS))
+
+
+class Item(NamedTuple):
+    """A single thing that we own."""
+
+    id: str
+    name: str
+    description: str | None = None
+    url: str | None = None
+
+
+def read_dump(fname: str) -> Iterator[tuple[Item, str]]:
+    """Reads an inventory export: one JSON object per line, with "id" and
+    "name" and optionally "description" and "url". Yields items along with
+    a digest of their line."""
+    with open(fname, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            item = Item(
+                str(data["id"]),
+                data["name"],
+                data.get("description"),
+                data.get("url"),
+            )
+            digest = hashlib.blake2b(line.encode(), digest_size=8)
+            yield item, digest.hexdigest()
+
+
+def index_terms(item: Item) -> str:
+    """What gets indexed for an item: stemmed words of its name and
+    description."""
+    text = item.name + " " + (item.description or "")
+    return " ".join(mariusz.text.search_terms(text))
+
+
+class Inventory:
+    """Inventory items in SQLite with an FTS5 index over their (stemmed,
+    diacritic-free) names and descriptions.
+
+    load() can take a while for a large dump, so it opens its own
+    connection and is meant to run in an executor; thanks to WAL, search()
+    keeps working on the event loop in the meantime."""
+
+    def __init__(self, fname: str) -> None:
+        self.fname = fname
+        self.db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.fname)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def load(self, dump: str) -> int:
+        """Brings the index up to date with the dump, touching only the
+        items that were added, changed or removed. Returns how many there
+        were; does nothing if the dump didn't change since the last load."""
+        stat = os.stat(dump)
+        version = f"{stat.st_mtime_ns}:{stat.st_size}"
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT value FROM state WHERE key = 'dump'"
+            ).fetchone()
+            if row and row[0] == version:
+                return 0
+            known = dict(db.execute("SELECT id, digest FROM items"))
+            changed = 0
+            with db:
+                for item, digest in read_dump(dump):
+                    if known.pop(item.id, None) == digest:
+                        continue
+                    changed += 1
+                    self._upsert(db, item, digest)
+                for item_id in known:
+                    changed += 1
+                    self._delete(db, item_id)
+                db.execute(
+                    "INSERT OR REPLACE INTO state VALUES ('dump', ?)",
+                    (version,),
+                )
+        finally:
+            db.close()
+        LOGGER.info("Inventory: %d items changed in %s", changed, dump)
+        return changed
+
+    @staticmethod
+    def _delete(db: sqlite3.Connection, item_id: str) -> int | None:
+        row = db.execute(
+            "DELETE FROM items WHERE id = ? RETURNING rowid", (item_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute("DELETE FROM items_fts WHERE rowid = ?", row)
+        return row[0]
+
+    def _upsert(self, db: sqlite3.Connection, item: Item, digest: str) -> None:
+        rowid = self._delete(db, item.id)
+        cursor = db.execute(
+            "INSERT INTO items(rowid, id, name, description, url, digest)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, *item, digest),
+        )
+        db.execute(
+            "INSERT INTO items_fts(rowid, terms) VALUES (?, ?)",
+            (cursor.lastrowid, index_terms(item)),
+        )
+
+    def search(
+        self, query: str, limit: int = 3, candidates: int = 100
+    ) -> list[Item]:
+        """Returns the best matches for the query. Every word of the query
+        has to match the beginning of a word of the item; if no item has
+        all of them, items matching any of its meaningful words (not stop
+        words, at least 3 letters long) are returned.
+
+        Only the first `candidates` matches are ranked: ranking is what
+        makes a query slow when it matches a big part of the inventory."""
+        terms = mariusz.text.search_terms(query)
+        if not terms:
+            return []
+        rows = self._match(terms, " AND ", limit, candidates)
+        meaningful = [
+            term
+            for term in terms
+            if len(term) >= 3 and term not in _STOP_TERMS
+        ]
+        # With a single word, OR would be the same query as AND.
+        if not rows and meaningful and len(terms) > 1:
+            rows = self._match(meaningful, " OR ", limit, candidates)
+        return [Item(*row) for row in rows]
+
+    def _match(
+        self, terms: list[str], operator: str, limit: int, candidates: int
+    ) -> list[tuple]:
+        prefixes = [f'"{term}"*' for term in terms]
+        return self.db.execute(
+            "SELECT items.id, name, description, url FROM ("
+            "   SELECT rowid, rank FROM items_fts"
+            "   WHERE items_fts MATCH ? LIMIT ?"
+            ") AS found JOIN items ON items.rowid = found.rowid"
+            " ORDER BY found.rank LIMIT ?",
+            (operator.join(prefixes), candidates, limit),
+        ).fetchall()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the database."""
+        self.db.close()
@@ -0,0 +1,82 @@
+"""Logging setup: records are queued on the event loop and formatted and
+written by a background thread."""
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import TextIO
+
+COMPACT_FORMAT = "%(asctime)s %(levelname).1s %(name)s: %(message)s"
+
+# httpx logs every request (including each getUpdates) at INFO.
+DEFAULT_LEVELS = "INFO,httpx=WARNING,httpcore=WARNING"
+
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """Parses e.g. "INFO,mariusz.chatdb=DEBUG" into {"": "INFO",
+    "mariusz.chatdb": "DEBUG"}. A bare level applies to the root logger."""
+    levels = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, level = item.rpartition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class SampleFilter(logging.Filter):
+    """Lets through only every `every`-th DEBUG record from each call site,
+    so that a chatty debug statement doesn't flood the log. Records at INFO
+    and above always pass."""
+
+    def __init__(self, every: int = 1) -> None:
+        super().__init__()
+        self.every = every
+        self.seen: dict[tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or record.levelno > logging.DEBUG:
+            return True
+        site = (record.pathname, record.lineno)
+        seen = self.seen.get(site, 0)
+        self.seen[site] = seen + 1
+        return seen % self.every == 0
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler formats the message here, on the caller's
+        # thread. The queue never leaves the process, so we pass the record
+        # as is and leave formatting to the listener.
+        return record
+
+
+def setup(
+    levels: str | None = None,
+    sample_every: int | None = None,
+    stream: TextIO | None = None,
+) -> logging.handlers.QueueListener:
+    """Configures the root logger. Levels come from LOG_LEVEL (see
+    parse_levels()) and DEBUG sampling from LOG_SAMPLE_EVERY unless given
+    explicitly. Returns the started listener; stop it before exiting so
+    that queued records get written."""
+    if levels is None:
+        levels = os.environ.get("LOG_LEVEL", DEFAULT_LEVELS)
+    if sample_every is None:
+        sample_every = int(os.environ.get("LOG_SAMPLE_EVERY", "1"))
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(COMPACT_FORMAT))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(SampleFilter(sample_every))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    for name, level in parse_levels(levels).items():
+        logging.getLogger(name or None).setLevel(level)
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+    return listener
@@ -4,175 +4,201 @@
 """Entry point of Mariusz, a Telegram chatbot of Hakierspejs Łódź."""
 
 import asyncio
+import json
 import logging
 import os
 import random
 import re
-import sqlite3
-import subprocess
+import signal
+import threading
 import time
 import traceback
-from typing import Any, Callable, Coroutine, Generator
+from typing import Any, Awaitable, TypeVar
 
 import telegram
 from telegram.error import NetworkError
 
+import mariusz.broadcast
+import mariusz.chatdb
+import mariusz.config
+import mariusz.dispatch
 import mariusz.gnujdb
+import mariusz.httpd
+import mariusz.inventory
+import mariusz.logs
 import mariusz.meetup
+import mariusz.metrics
 import mariusz.mumble
+import mariusz.outbox
+import mariusz.profiler
+import mariusz.scheduler
+import mariusz.sources
+import mariusz.text
+import mariusz.throttle
+import mariusz.version
+import mariusz.watchdog
+import mariusz.webhook
 import mariusz.wiki
+import mariusz.workers
 
-LOGGER = logging.getLogger()
-
-MUMBLE_SERVER = "hs-ldz.pl"
-
-POLISH_TO_LATIN = {
-    "ą": "a",
-    "Ą": "A",
-    "ć": "c",
-    "Ć": "C",
-    "ę": "e",
-    "Ę": "E",
-    "ł": "l",
-    "Ł": "L",
-    "ń": "n",
-    "Ń": "N",
-    "ó": "o",
-    "Ó": "O",
-    "ś": "s",
-    "Ś": "S",
-    "ź": "z",
-    "Ź": "Z",
-    "ż": "z",
-    "Ż": "Z",
-}
-
-MAIN_CHAT_ID = int(os.environ["MAIN_CHAT_ID"])
-
-
-def normalize_word(word: str) -> str:
-    """Returns a version of the word with removed Polish diacritic
-    characters."""
-    output = ""
-    for letter in word:
-        output += POLISH_TO_LATIN.get(letter, letter)
-    LOGGER.debug("normalize_word(%r)=%r", word, output)
-    return output
-
-
-def normalize(sequence_of_words: set[str]) -> set[str]:
-    """Transforms a sequence of words into a set of words both with and without
-    Polish diacritic characters."""
-    output = set()
-    for word in sequence_of_words:
-        output.add(word)
-        output.add(normalize_word(word))
-    LOGGER.debug("normalize(%r)=%r", sequence_of_words, output)
-    return output
-
-
-def build_version_description() -> str:
-    """Describes the current version of the bot."""
-    try:
-        with open("/tmp/commit-id") as fh:
-            version = fh.read().strip()
-        with open("/tmp/commit-no") as fh:
-            numer = fh.read().strip()
-        with open("/tmp/commit-date") as fh:
-            date = fh.read().strip()
-    except FileNotFoundError:
-        version_b = subprocess.check_output(["git", "rev-parse", "HEAD"])
-        version = version_b.decode()
-        no_b = subprocess.check_output(["git", "log", "HEAD", "--oneline"])
-        numer = str(len(no_b.split(b"\n")))
-        date = (
-            subprocess.check_output(
-                ["git", "show", "-s", "--format=%ci", "HEAD"]
-            )
-            .decode()
-            .strip()
-        )
-    return f"{version[:6]} (#{numer}, {date})"
-
+LOGGER = logging.getLogger(__name__)
 
-class ChatDb:
-    """Collects a list of chats that the bot ever spoke with."""
+# Docker waits 10 seconds after SIGTERM before it kills the container.
+SHUTDOWN_TIMEOUT = 8.0
 
-    def __init__(self, fname: str) -> None:
-        self.db = sqlite3.connect(fname)
-        self.load_schema()
-
-    def load_schema(self) -> None:
-        """Initializes the database by creating required entities."""
-        self.db.execute("CREATE TABLE IF NOT EXISTS chat_ids (chat_id TEXT);")
-
-    def insert(self, chat_id: int) -> None:
-        """Inserts a chat into the set."""
-        return
-        if int(chat_id) in self.list():
-            return
-        sql = "INSERT INTO chat_ids(chat_id) VALUES (?)"
-        cur = self.db.cursor()
-        cur.execute(sql, (chat_id,))
-        self.db.commit()
-
-    def list(self) -> Generator[int, Any, None]:
-        """Generated a sequence of chats that the bot ever spoke with."""
-        for row in self.db.execute("SELECT DISTINCT chat_id FROM chat_ids"):
-            yield int(row[0])
+T = TypeVar("T")
 
 
 class Mariusz:
     """Main class of the bot. Handles all the commands."""
 
     def __init__(
-        self, api_key: str, path_to_chat_db: str, group_regex: str | None
+        self,
+        api_key: str,
+        path_to_chat_db: str,
+        group_regex: str | None,
+        main_chat_id: int = 0,
+        webhook_url: str | None = None,
+        webhook_listen: str = "127.0.0.1:8080",
+        webhook_secret: str | None = None,
+        metrics_listen: str | None = None,
+        stall_threshold: float = 0.5,
+        inventory_dump: str | None = None,
+        inventory_index: str | None = None,
+        bot: telegram.Bot | None = None,
+        sources: mariusz.sources.SharedSources | None = None,
+        watchdog: mariusz.watchdog.StallWatchdog | None = None,
+        throttle_chat: str | None = None,
+        throttle_user: str | None = None,
+        profile_dir: str | None = None,
     ):
         self.update_id: int | None = None
-        self.reactions: dict[
-            re.Pattern[str],
-            Callable[[telegram.Update], Coroutine[Any, Any, None]],
-        ] = {}
-        self.last_meetup_check: float = 0
-        self.bot = telegram.Bot(api_key)
+        self.reactions = mariusz.dispatch.Dispatcher()
+        self.workers = mariusz.workers.ChatWorkers(max_in_flight=64)
+        self.scheduler = mariusz.scheduler.Scheduler()
+        self.bot = bot or telegram.Bot(api_key)
+        self.metrics = mariusz.metrics.Registry()
+        self.metrics_listen = metrics_listen
+        self.handler_seconds = self.metrics.histogram(
+            "mariusz_handler_seconds", "How long each reaction takes."
+        )
+        self.get_updates_seconds = self.metrics.histogram(
+            "mariusz_get_updates_seconds",
+            "Round-trip time of getUpdates, including the long-poll wait.",
+        )
+        # There's one event loop per process, so bots running together
+        # share the watchdog; whoever created it starts and stops it.
+        self.owns_watchdog = watchdog is None
+        self.loop_lag = watchdog or mariusz.watchdog.StallWatchdog(
+            self.metrics, threshold=stall_threshold
+        )
+        if not self.owns_watchdog:
+            self.loop_lag.register(self.metrics)
+        self.metrics.gauge(
+            "mariusz_job_last_run_age_seconds",
+            "Seconds since each periodic job last started.",
+            lambda: self._job_stats("last_run_ago"),
+        )
+        self.metrics.gauge(
+            "mariusz_job_last_duration_seconds",
+            "How long the last run of each periodic job took.",
+            lambda: self._job_stats("last_duration"),
+        )
+        self.metrics.gauge(
+            "mariusz_job_failures",
+            "How many runs of each periodic job failed.",
+            lambda: self._job_stats("failures"),
+        )
+        self.broadcaster = mariusz.broadcast.Broadcaster(
+            self.bot, metrics=self.metrics
+        )
+        # Reactions aren't throttled unless a limit is given.
+        self.throttle: mariusz.throttle.Throttle | None = None
+        if throttle_chat or throttle_user:
+            self.throttle = mariusz.throttle.Throttle(
+                chat_limit=throttle_chat or mariusz.throttle.CHAT_LIMIT,
+                user_limit=throttle_user or mariusz.throttle.USER_LIMIT,
+                metrics=self.metrics,
+            )
+        self.main_chat_id = main_chat_id
         self.group_regex = group_regex
-        self.meetup_exception_counter = 0
-        self.mumble_state = mariusz.mumble.get_mumble_user_count(MUMBLE_SERVER)
+        # Meetup, wiki and Mumble are polled by whoever owns the sources:
+        # this bot, unless it shares them with other bots in the process.
+        self.owns_sources = sources is None
+        self.sources = sources or mariusz.sources.SharedSources()
+        self.sources.subscribe(self)
+        self.meetup = self.sources.meetup(group_regex)
+        self.meetup_lock = asyncio.Lock()
+        self.mumble_state: int | None = None
         self.mumble_last_update = time.time()
-        self.mumble_last_check = time.time()
-        self.wiki_last_update = time.time()
-        self.wiki_last_check = time.time()
-        self.wiki_msg: str | None = None
+        self.inventory_dump = inventory_dump
+        self.inventory: mariusz.inventory.Inventory | None = None
+        if inventory_dump:
+            self.inventory = mariusz.inventory.Inventory(
+                inventory_index or inventory_dump + ".sqlite"
+            )
 
+        self.outbox: mariusz.outbox.Outbox | None = None
         if path_to_chat_db:
-            self.chat_db: ChatDb | None = ChatDb(path_to_chat_db)
+            self.chat_db: mariusz.chatdb.ChatDb | None = mariusz.chatdb.ChatDb(
+                path_to_chat_db
+            )
+            self.outbox = mariusz.outbox.Outbox(
+                self.chat_db.db,
+                self.broadcaster,
+                combine={
+                    "wiki": mariusz.outbox.join("Zmiany na wiki ({n}):"),
+                    "mumble": mariusz.outbox.latest,
+                },
+            )
         else:
             self.chat_db = None
 
-        self.build_version = build_version_description()
+        # Updates are long-polled with getUpdates unless a webhook is set up.
+        self.webhook: mariusz.webhook.WebhookServer | None = None
+        self.webhook_deleted = False
+        if webhook_url:
+            host, port = mariusz.httpd.parse_address(webhook_listen, 8080)
+            self.webhook = mariusz.webhook.WebhookServer(
+                self.bot, webhook_url, host, port, secret_token=webhook_secret
+            )
+
+        self.build_version = mariusz.version.describe()
+        self.stopping = asyncio.Event()
+        self.shutdown_timeout = SHUTDOWN_TIMEOUT
+        # Updates whose reactions are queued or running.
+        self.unfinished: dict[int, telegram.Update] = {}
+        self.profiler = mariusz.profiler.PROFILER
+        self.profile_dir = profile_dir
+        self.profiling: asyncio.Task[None] | None = None
+        # Patterns of commands that answer with information rather than
+        # chatter; they're never throttled.
+        self.unthrottled: set[str] = set()
 
         self.on(
-            normalize({"Łódź", "Łodzi", "łódzkie"}),
+            {"Łódź", "Łodzi", "łódzkie"},
             "https://www.youtube.com/watch?v=IJ2kvZpJ_BU",
         )
-        self.on({"\\.wersja"}, self.version)
+        self.on({"\\.wersja"}, self.version, throttled=False)
+        self.on({"\\.profil"}, self.profile, throttled=False)
         self.on({"jeszcze jak"}, "https://www.youtube.com/watch?v=_jX3qsyIlHc")
         self.on(mariusz.gnujdb.TRIGGERS, self.czymamy)
         # self.on({'nie wiem'}, 'https://www.youtube.com/watch?v=QnMqRTu4Rcc')
         self.on({"\\.panjezus"}, "https://www.youtube.com/watch?v=aWJ8X3mt8Io")
         self.on({"\\.corobic"}, "https://www.youtube.com/watch?v=6NR-Lq-hhSw")
         self.on({"\\.co"}, "https://www.youtube.com/watch?v=YeIGdcSM5NY")
-        self.on({"\\.help", "\\.pomoc", "\\.komendy"}, self.help)
+        self.on(
+            {"\\.help", "\\.pomoc", "\\.komendy"}, self.help, throttled=False
+        )
         self.on({"\\.czy"}, self.czy)
+        self.on({"\\.stats"}, self.stats, throttled=False)
 
     async def send_to_all_chats(self, msg: str) -> None:
         """Sends a message to all the chats other than the main one."""
         if self.chat_db is None:
             return
-        for chat_id in self.chat_db.list():
-            if chat_id == MAIN_CHAT_ID:
-                continue
-            await self.try_send_message(text=msg, chat_id=chat_id)
+        chat_ids = [c for c in self.chat_db.list() if c != self.main_chat_id]
+        await self.broadcaster.send_message(chat_ids, msg)
 
     async def try_send_message(
         self, *args: Any, **kwargs: Any
@@ -180,7 +206,7 @@ class Mariusz:
         """A wrapper for send_message that silences Unauthorized exception."""
         try:
             ret = await self.bot.send_message(*args, **kwargs)
-            LOGGER.debug("try_send_message(%r, %r)=%r", args, kwargs, ret)
+            LOGGER.debug("try_send_message(): sent %d", ret.message_id)
             return ret
         except telegram.error.BadRequest as e:
             LOGGER.exception(e)
@@ -189,13 +215,14 @@ class Mariusz:
     def on(
         self,
         text: set[str],
-        reaction: str | Callable[[telegram.Update], Coroutine[Any, Any, None]],
+        reaction: str | mariusz.dispatch.Handler,
+        throttled: bool = True,
     ) -> None:
-        """Registers a reaction to a given text message."""
-        regex_str = "|".join(
-            ["^" + x if x.startswith("\\.") else x for x in text]
-        )
-        regex = re.compile(regex_str, flags=re.IGNORECASE)
+        """Registers a reaction to a given text message. Unless `throttled`
+        is False, it's subject to the limits of self.throttle."""
+        regex = mariusz.dispatch.compile_triggers(text)
+        if not throttled:
+            self.unthrottled.add(regex.pattern)
         if isinstance(reaction, str):
 
             async def say(update: telegram.Update) -> None:
@@ -276,16 +303,100 @@ class Mariusz:
         """Podaje pierwsze 6 znaków hasha commita wersji."""
         if not update.message:
             return
-        await update.message.reply_text(build_version_description())
+        await update.message.reply_text(self.build_version)
+
+    async def profile(self, update: telegram.Update) -> None:
+        """`.profil [sekundy] [ile funkcji]` profiluje bota (dla adminów)"""
+        message = update.message
+        if not message or not message.text or not message.from_user:
+            return
+        if message.chat_id != self.main_chat_id:
+            return
+        member = await self.bot.get_chat_member(
+            message.chat_id, message.from_user.id
+        )
+        if member.status not in (
+            telegram.ChatMember.ADMINISTRATOR,
+            telegram.ChatMember.OWNER,
+        ):
+            return
+        args = message.text.split()[1:]
+        try:
+            seconds = int(args[0]) if args else 10
+            top = int(args[1]) if len(args) > 1 else 10
+        except ValueError:
+            await message.reply_text("Użycie: .profil [sekundy] [ile funkcji]")
+            return
+        if self.profiler.running or (
+            self.profiling and not self.profiling.done()
+        ):
+            await message.reply_text("Profiler już działa.")
+            return
+        seconds = min(max(seconds, 1), 300)
+        await message.reply_text(f"Profiluję przez {seconds}s...")
+        # Runs in the background, so that the chat's other reactions don't
+        # wait for it.
+        self.profiling = asyncio.create_task(
+            self._profile(message, seconds, min(max(top, 1), 50))
+        )
+
+    async def _profile(
+        self, message: telegram.Message, seconds: float, top: int
+    ) -> None:
+        # Nobody awaits this task, so errors have to be reported here.
+        try:
+            await message.reply_text(await self._profile_report(seconds, top))
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.exception("profile() failed")
+            try:
+                await message.reply_text(f"Profilowanie nie wyszło: {e!r}")
+            except telegram.error.TelegramError as reply_error:
+                LOGGER.warning("profile(): can't reply: %r", reply_error)
+
+    async def _profile_report(self, seconds: float, top: int) -> str:
+        profile = await self.profiler.profile(seconds)
+        samples = max(profile.samples, 1)
+        idle = profile.idle(threading.main_thread().name)
+        lines = [
+            f"{profile.samples} próbek w {profile.duration:.1f}s,"
+            f" pętla zdarzeń bezczynna przez {idle:.0%} z nich.",
+            "Na stosie (w tym sama funkcja):",
+        ]
+        for function, own, total in profile.top(top):
+            lines.append(
+                f"{total / samples:4.0%} ({own / samples:.0%}) {function}"
+            )
+        if self.profile_dir:
+            path = os.path.join(
+                self.profile_dir,
+                time.strftime("profil-%Y%m%d-%H%M%S.txt"),
+            )
+            await asyncio.to_thread(_write, path, profile.collapsed())
+            lines.append(f"Stosy do flamegraphu: {path}")
+        return "\n".join(lines)
 
     async def czymamy(self, update: telegram.Update) -> None:
         if not update.message or not update.message.text:
             return
 
         # Czy jest w spejse pickit 2?
-        url = mariusz.gnujdb.czymamy(update.message.text)
-        if url:
+        query = mariusz.gnujdb.extract_query(update.message.text)
+        if query is None:
+            return
+        url = mariusz.gnujdb.search_url(query)
+        items = (
+            self.inventory.search(query) if self.inventory is not None else []
+        )
+        if not items:
             await update.message.reply_text(url)
+            return
+        lines = ["Mamy:"]
+        for item in items:
+            lines.append(
+                f"- {item.name}" + (f" {item.url}" if item.url else "")
+            )
+        lines.append(f"\nWięcej: {url}")
+        await update.message.reply_text("\n".join(lines))
 
     async def help(self, update: telegram.Update) -> None:
         """Wyświetla pomoc"""
@@ -300,100 +411,178 @@ class Mariusz:
             msg, parse_mode=telegram.constants.ParseMode.MARKDOWN
         )
 
-    def prepare_meetup_message(self) -> str | None:
-        try:
-            message = mariusz.meetup.prepare_meetup_message(self.group_regex)
-            self.meetup_exception_counter = 0
-        except Exception:
-            self.meetup_exception_counter += 1
-            if self.meetup_exception_counter > 10:
-                raise
-            time.sleep(10.0)
-            return None
-        return message
+    def _job_stats(self, key: str) -> list[tuple[dict[str, str], float]]:
+        return [
+            ({"job": job["name"]}, job[key]) for job in self.scheduler.stats()
+        ]
+
+    async def stats(self, update: telegram.Update) -> None:
+        """Pokazuje, gdzie bot traci czas"""
+        if not update.message:
+            return
+
+        lines = ["Reakcje:"]
+        for reaction in self.reactions:
+            lines.append(
+                f"  {reaction.pattern}: "
+                + self.handler_seconds.describe(reaction=reaction.pattern)
+            )
+        lines.append("getUpdates: " + self.get_updates_seconds.describe())
+        lines.append("Rozgłoszenia: " + self.broadcaster.duration.describe())
+        deliveries = self.broadcaster.deliveries
+        lines.append(
+            f"  dostarczone: {deliveries.get(result='sent'):g},"
+            f" nieudane: {deliveries.get(result='failed'):g}"
+        )
+        if self.throttle:
+            suppressed = sum(self.throttle.suppressed.values.values())
+            lines.append(f"Zdławione reakcje: {suppressed:g}")
+        lines.append("Zadania:")
+        for job in self.scheduler.stats():
+            ago = job["last_run_ago"]
+            took = job["last_duration"]
+            lines.append(
+                f"  {job['name']}: "
+                + (
+                    "jeszcze nie ruszyło"
+                    if ago is None
+                    else f"{ago:.0f}s temu, trwało {took:.3f}s"
+                )
+                + f", błędów: {job['failures']}"
+            )
+        lines.append(f"Opóźnienie pętli: {self.loop_lag.lag * 1000:.1f}ms")
+        await update.message.reply_text("\n".join(lines))
 
     async def maybe_update_meetup_message(self) -> None:
         """Determines whether current pinned meetup message should be replaced
         and updates it if necessary."""
-        if self.last_meetup_check + (3600 * 1) > time.time():
-            LOGGER.debug(
-                "maybe_update_meetup_message: "
-                "self.last_meetup_check + (3600 * 1) > time.time()"
-            )
+        # Both the periodic job and the one timed for the next change call
+        # this; they shouldn't pin the same message twice.
+        async with self.meetup_lock:
+            await self._update_meetup_message()
+
+    async def _update_meetup_message(self) -> None:
+        # Never blocks: a stale list gets re-scraped in the background and
+        # picked up by one of the next runs.
+        events = self.meetup.get()
+        if events is None:
+            LOGGER.debug("maybe_update_meetup_message(): no events yet")
             return
-
-        message = self.prepare_meetup_message()
+        message = mariusz.meetup.build_meetup_message(events)
+        # The periodic job picks up new scrapes; the message also changes
+        # when the meetup is close and after it, so check again right then.
+        delay = mariusz.meetup.seconds_until_change(events)
+        if delay is not None:
+            self.scheduler.once(
+                delay + 1,
+                self.maybe_update_meetup_message,
+                "meetup_transition",
+                timeout=600,
+            )
 
         if not message:
             LOGGER.debug("maybe_update_meetup_message(): not message")
             return
-        self.last_meetup_check = time.time()
         if self.chat_db is None:
             LOGGER.debug("maybe_update_meetup_message(): self.chat_db is None")
             return
-        for chat_id in self.chat_db.list():
-            if chat_id > 0:  # skip if it's a private chat instead of a group
-                LOGGER.debug("maybe_update_meetup_message(): chat_id > 0")
-                continue
-            chat = await self.bot.get_chat(chat_id=chat_id)
-            if chat.pinned_message and chat.pinned_message.text == message:
+
+        chat_db = self.chat_db
+
+        async def pin(chat_id: int) -> telegram.Message | None:
+            known = chat_db.get(chat_id)
+            if known is None or known.pinned_text is None:
+                # We don't know what's pinned there yet, ask Telegram once.
+                chat = await self.broadcaster.call(
+                    self.bot.get_chat, chat_id=chat_id, per_chat=False
+                )
+                if chat.pinned_message:
+                    chat_db.set_pinned(
+                        chat_id,
+                        chat.pinned_message.text or "",
+                        chat.pinned_message.message_id,
+                    )
+                known = chat_db.get(chat_id)
+            if known is not None and known.pinned_text == message:
                 LOGGER.debug("maybe_update_meetup_message(): nihil novi")
-                continue
-            msg = await self.try_send_message(text=message, chat_id=chat_id)
-            if not msg:
-                LOGGER.debug("maybe_update_meetup_message(): not msg")
-                continue
+                return None
+            previous = known.pinned_message_id if known else None
+            msg = await self.broadcaster.call(
+                self.bot.send_message, text=message, chat_id=chat_id
+            )
+            # Stored before pinning: where the bot may post but not pin, the
+            # announcement would be sent again on every run otherwise.
+            chat_db.set_pinned(chat_id, message, msg.message_id)
             LOGGER.debug("maybe_update_meetup_message(): updating...")
             try:
-                await self.bot.unpin_chat_message(chat_id=msg.chat_id)
+                await self.broadcaster.call(
+                    self.bot.unpin_chat_message,
+                    chat_id=chat_id,
+                    message_id=previous,
+                    per_chat=False,
+                )
             except telegram.error.BadRequest:
                 pass  # nothing to unpin, dismiss
-            await self.bot.pin_chat_message(
-                message_id=msg.message_id, chat_id=msg.chat_id
+            await self.broadcaster.call(
+                self.bot.pin_chat_message,
+                message_id=msg.message_id,
+                chat_id=chat_id,
+                per_chat=False,
             )
+            return msg
+
+        await self.broadcaster.run(chat_db.groups(), pin)
 
     async def maybe_update_wiki(self) -> None:
         """Check if anybody wrote anything on our wiki."""
-        if self.wiki_msg is None:
-            # Initialize here, as we can't invoke async functions in __init__
-            self.wiki_msg = await mariusz.wiki.build_wiki_message()
-            return
+        await self.sources.poll_wiki()
 
-        now = time.time()
-        if now - self.wiki_last_check < 60:
+    def on_wiki_entries(self, entries: list[mariusz.wiki.WikiEntry]) -> None:
+        """Queues notifications about changes in the wiki."""
+        if self.chat_db is None or self.outbox is None:
+            return
+        # don't spam our main group
+        chat_ids = [c for c in self.chat_db.list() if c != self.main_chat_id]
+        # Edits come in bursts; the outbox sends them as one message.
+        for entry in entries:
+            msg = mariusz.wiki.build_wiki_message(entry)
+            self.outbox.put(chat_ids, "wiki", msg, window=120)
+
+    async def refresh_inventory(self) -> None:
+        """Updates the inventory index if the dump changed."""
+        if self.inventory is None or self.inventory_dump is None:
             return
-        msg = await mariusz.wiki.build_wiki_message()
-        differs = self.wiki_msg != msg
-        late_enough = abs(now - self.wiki_last_update) > 60
-        no_error = msg and self.wiki_msg
-        if differs and late_enough and no_error and self.chat_db:
-            for chat_id in self.chat_db.list():
-                if chat_id == MAIN_CHAT_ID:
-                    continue  # don't spam our main group
-                await self.try_send_message(text=msg, chat_id=chat_id)
-                self.wiki_msg = msg
-                self.wiki_last_update = now
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self.inventory.load, self.inventory_dump
+        )
 
     async def maybe_update_mumble(self) -> None:
         """Check if Mumble state changed: we either transitioned from 0 to
         nonzero or the other way around."""
-        return
+        await self.sources.poll_mumble()
+
+    def on_mumble_status(self, status: mariusz.mumble.MumbleStatus) -> None:
+        """Queues a notification if somebody joined an empty Mumble server
+        or everybody left."""
         now = time.time()
-        if now - self.mumble_last_check < 60:
+        cnt = max(status.users - 1, 0)
+        if (
+            self.mumble_state is None
+            or self.chat_db is None
+            or self.outbox is None
+        ):
+            self.mumble_state = cnt
             return
-        cnt = max(mariusz.mumble.get_mumble_user_count(MUMBLE_SERVER) - 1, 0)
         state_changed = cnt != self.mumble_state
         if state_changed and abs(now - self.mumble_last_update) > 60:
             if cnt > self.mumble_state:
                 msg = "Ktoś się pojawił na Mumble. Liczba userów: " + str(cnt)
             else:
                 msg = "Ktoś opuścił Mumble. Liczba userów: " + str(cnt)
-            for chat_id in self.chat_db.list():
-                if chat_id > 0:
-                    continue  # skip if it's a private chat instead of a group
-                await self.try_send_message(text=msg, chat_id=chat_id)
-                self.mumble_state = cnt
-                self.mumble_last_update = now
+            self.outbox.put(self.chat_db.groups(), "mumble", msg, window=0)
+            self.mumble_state = cnt
+            self.mumble_last_update = now
 
     async def run(self) -> None:
         """Bot's main loop."""
@@ -401,62 +590,354 @@ class Mariusz:
         msg = f"Bot się wita po restarcie. wersja={self.build_version}"
         await self.send_to_all_chats(msg)
 
-        try:
-            updates = await self.bot.get_updates()
-            self.update_id = updates[0].update_id
-        except IndexError:
-            self.update_id = None
+        # Resume right after the last update we processed before the
+        # restart. Without a stored offset, Telegram sends what's pending.
+        if self.chat_db:
+            self.update_id = self.chat_db.update_offset
+            for data in self.chat_db.take_unfinished():
+                LOGGER.info("Handling an update left by the previous run")
+                await self.process_update(
+                    telegram.Update.de_json(json.loads(data), self.bot)
+                )
+        if self.webhook:
+            await self.webhook.start()
+        if self.metrics_listen:
+            host, port = mariusz.httpd.parse_address(self.metrics_listen, 9100)
+            await self.metrics.serve(host, port)
+        if self.owns_watchdog:
+            self.loop_lag.start()
+
+        # Hourly, like the scrapes; the moments when the message changes on
+        # its own get runs of their own (see _update_meetup_message()).
+        self.scheduler.every(
+            3600, self.maybe_update_meetup_message, jitter=60, timeout=600
+        )
+        if self.owns_sources:
+            schedule_sources(self.scheduler, self.sources)
+        if self.chat_db:
+            self.scheduler.every(
+                self.chat_db.flush_interval, self.flush_chat_db, delay=10
+            )
+        if self.outbox is not None:
+            self.scheduler.every(5, self.outbox.flush, "outbox", timeout=300)
+        if self.inventory is not None:
+            # The first run, right away, builds the index from the dump.
+            self.scheduler.every(600, self.refresh_inventory, timeout=600)
+        scheduler = asyncio.create_task(self.scheduler.run())
 
-        while True:
+        try:
+            while not self.stopping.is_set():
+                try:
+                    updates = await self._unless_stopping(self.fetch_updates())
+                    updates = updates or []
+                    for index, update in enumerate(updates):
+                        if self.stopping.is_set():
+                            # getUpdates sends the rest again after the
+                            # restart; the webhook doesn't.
+                            if self.webhook:
+                                self.unfinished.update(
+                                    (u.update_id, u) for u in updates[index:]
+                                )
+                            break
+                        # Waiting for a free worker can take a while; the
+                        # update is in self.unfinished by then.
+                        await self._unless_stopping(
+                            self.process_update(update)
+                        )
+                except NetworkError:
+                    await self._unless_stopping(asyncio.sleep(1))
+                except Exception:
+                    formatted_traceback = traceback.format_exc()
+                    message = f"Bot umar. Traceback:\n\n{formatted_traceback}"
+                    await self.send_to_all_chats(message)
+                    # Don't restart in a crash loop, but don't hold up a
+                    # deliberate stop either.
+                    await self._unless_stopping(asyncio.sleep(600))
+                    raise
+        finally:
+            scheduler.cancel()
+            await self.shutdown(self.shutdown_timeout)
+
+    def stop(self) -> None:
+        """Makes run() stop polling and shut down. Safe to call from a
+        signal handler."""
+        self.stopping.set()
+
+    async def _unless_stopping(self, aw: Awaitable[T]) -> T | None:
+        """Awaits `aw`, unless stop() is called first; then cancels it and
+        returns None."""
+        task = asyncio.ensure_future(aw)
+        stopping = asyncio.create_task(self.stopping.wait())
+        await asyncio.wait(
+            {task, stopping}, return_when=asyncio.FIRST_COMPLETED
+        )
+        stopping.cancel()
+        if not task.done():
+            task.cancel()
+            return None
+        return task.result()
+
+    async def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Lets the reactions and periodic jobs that are already running
+        finish and sends the notifications that are due, for up to
+        `timeout` seconds together. Then saves the update offset and closes
+        everything. Reactions that didn't finish in time are interrupted
+        and their updates stored, to be handled again by the next run;
+        notifications that weren't sent stay in the outbox."""
+        LOGGER.info("Shutting down")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        if self.webhook:
+            await self.webhook.stop()
+            # Already accepted, so Telegram won't send them again.
+            for update in self.webhook.take_queued():
+                self.unfinished[update.update_id] = update
+        if self.profiling is not None and not self.profiling.done():
+            self.profiling.cancel()  # nobody would get the report anyway
+            await asyncio.gather(self.profiling, return_exceptions=True)
+        drain = asyncio.gather(self.workers.join(), self.scheduler.join())
+        done, _ = await asyncio.wait({drain}, timeout=timeout)
+        if not done:
+            self.workers.cancel()
+            for task in self.scheduler.tasks:
+                task.cancel()
+            await drain
+        if self.outbox is not None and loop.time() < deadline:
             try:
-                await asyncio.gather(
-                    self.maybe_update_meetup_message(),
-                    self.maybe_update_mumble(),
-                    self.maybe_update_wiki(),
-                    self.handle_messages(),
+                await asyncio.wait_for(
+                    self.outbox.flush(), deadline - loop.time()
+                )
+            except asyncio.TimeoutError:
+                LOGGER.warning("Shutdown: outbox left for the next run")
+        if self.owns_watchdog:
+            self.loop_lag.stop()
+        if self.chat_db:
+            if self.unfinished:
+                LOGGER.warning(
+                    "Shutdown: saving %d unfinished updates",
+                    len(self.unfinished),
+                )
+                self.chat_db.save_unfinished(
+                    {
+                        update_id: update.to_json()
+                        for update_id, update in self.unfinished.items()
+                    }
                 )
-            except NetworkError:
-                await asyncio.sleep(1)
-            except Exception:
-                formatted_traceback = traceback.format_exc()
-                message = f"Bot umar. Traceback:\n\n{formatted_traceback}"
-                await self.send_to_all_chats(message)
-                await asyncio.sleep(600)
+            self.chat_db.close()
+        if self.owns_sources:
+            await self.sources.aclose()
+        LOGGER.info("Shut down")
+
+    async def flush_chat_db(self) -> None:
+        """Writes chats and the update offset that are waiting in memory."""
+        if self.chat_db:
+            self.chat_db.maybe_flush()
+
+    async def fetch_updates(self) -> list[telegram.Update]:
+        """Waits for new updates. Telegram only forgets the updates once we
+        ask for ones after them, so this can be cancelled safely."""
+        if self.webhook:
+            return await self.webhook.get_updates(timeout=10)
+        try:
+            with self.get_updates_seconds.time():
+                return list(
+                    await self.bot.get_updates(
+                        offset=self.update_id, timeout=10
+                    )
+                )
+        except telegram.error.Conflict:
+            if self.webhook_deleted:
                 raise
+            # Most likely a webhook left behind by a run with WEBHOOK_URL:
+            # Telegram doesn't answer getUpdates while one is set.
+            LOGGER.warning("getUpdates conflicts with a webhook, deleting it")
+            await self.bot.delete_webhook()
+            self.webhook_deleted = True
+            return []
 
     async def handle_messages(self) -> None:
         """For each unread message, determines whether and how to react."""
-        updates = await self.bot.get_updates(offset=self.update_id, timeout=10)
-
-        for update in updates:
-            if update.update_id:
-                self.update_id = update.update_id + 1
-            if update.message is None or update.message.text is None:
-                continue
+        for update in await self.fetch_updates():
+            await self.process_update(update)
+
+    async def process_update(self, update: telegram.Update) -> None:
+        """Registers a single update and queues up the reactions to it. They
+        run concurrently with reactions in other chats, but in order within
+        the chat. Waits if too many reactions are already pending."""
+        if update.update_id and update.update_id >= (self.update_id or 0):
+            # Committed before reacting: a reaction that fails or hangs
+            # shouldn't be retried over and over after restarts. Ones that
+            # get interrupted by a shutdown are stored (see shutdown()).
+            self.update_id = update.update_id + 1
             if self.chat_db:
-                self.chat_db.insert(update.message.chat_id)
-            for reaction, funtion in self.reactions.items():
-                if reaction.match(update.message.text):
+                self.chat_db.set_update_offset(self.update_id)
+        if update.message is None or update.message.text is None:
+            return
+        if self.chat_db:
+            chat = update.message.chat
+            self.chat_db.insert(
+                chat.id,
+                chat_type=chat.type,
+                title=chat.title,
+                last_seen=update.message.date.timestamp(),
+            )
+        # Folded once here; every trigger was folded when it was registered.
+        # (Telegram objects are frozen, so the folded text can't be stored
+        # on the update itself.)
+        text = mariusz.text.fold(update.message.text)
+        matches = self.reactions.matching(text)
+        if self.throttle:
+            chat_id = update.message.chat_id
+            user = update.message.from_user
+            matches = [
+                (reaction, handler)
+                for reaction, handler in matches
+                if reaction.pattern in self.unthrottled
+                or self.throttle.allow(
+                    chat_id, user.id if user else None, reaction.pattern
+                )
+            ]
+        if matches:
+            self.unfinished[update.update_id] = update
+            await self.workers.submit(
+                update.message.chat_id, lambda: self.react(update, matches)
+            )
+
+    async def react(
+        self,
+        update: telegram.Update,
+        matches: list[tuple[re.Pattern[str], mariusz.dispatch.Handler]],
+    ) -> None:
+        """Runs the matched handlers one after another."""
+        try:
+            for reaction, funtion in matches:
+                with self.handler_seconds.time(reaction=reaction.pattern):
                     await funtion(update)
+        finally:
+            task = asyncio.current_task()
+            if task is None or not task.cancelling():
+                self.unfinished.pop(update.update_id, None)
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def stop_on_signals(bots: list[Mariusz]) -> None:
+    """Shuts the bots down gracefully on SIGTERM (sent by `docker stop` and
+    Watchtower) and SIGINT. A second signal kills the process as usual."""
+    loop = asyncio.get_running_loop()
+
+    def stop() -> None:
+        LOGGER.info("Got a signal, stopping")
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        for bot in bots:
+            bot.stop()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+
+
+def schedule_sources(
+    scheduler: mariusz.scheduler.Scheduler,
+    sources: mariusz.sources.SharedSources,
+) -> None:
+    """Sets up polling of the outside data shared by the bots."""
+    scheduler.every(60, sources.poll_mumble, "maybe_update_mumble", timeout=30)
+    scheduler.every(
+        60, sources.poll_wiki, "maybe_update_wiki", jitter=5, timeout=60
+    )
+
+
+async def run_many(configs: list[dict[str, Any]]) -> None:
+    """Runs several bots in one event loop. Each has its own poller and
+    chat database, but meetup, wiki and Mumble are fetched once for all of
+    them. They also share one stall watchdog, which uses the lowest of
+    their thresholds."""
+    sources = mariusz.sources.SharedSources()
+    watchdog = mariusz.watchdog.StallWatchdog(
+        threshold=min(config.get("stall_threshold", 0.5) for config in configs)
+    )
+    bots = [
+        Mariusz(sources=sources, watchdog=watchdog, **config)
+        for config in configs
+    ]
+    scheduler = mariusz.scheduler.Scheduler()
+    schedule_sources(scheduler, sources)
+    polling = asyncio.create_task(scheduler.run())
+    stop_on_signals(bots)
+    watchdog.start()
+    tasks = [asyncio.create_task(bot.run()) for bot in bots]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A bot that crashed takes the others down with it, gracefully.
+        for bot in bots:
+            bot.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        polling.cancel()
+        watchdog.stop()
+        await sources.aclose()
 
 
 async def main() -> None:
     """Program's entry point. Defined so that we don't polute the global
     namespace with extra variables."""
-    logfmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    logging.basicConfig(format=logfmt, level="DEBUG")
+    config = os.environ.get("CONFIG")
+    if config:
+        await run_many(mariusz.config.load(config))
+        return
+
     api_key = os.environ["API_KEY"]
     path_to_chat_db = os.environ.get("SCIEZKA_DO_BAZY_CHATOW")
     group_regex = os.environ.get("GROUP_REGEX")
+    webhook_url = os.environ.get("WEBHOOK_URL")
+    webhook_listen = os.environ.get("WEBHOOK_LISTEN", "127.0.0.1:8080")
+    webhook_secret = os.environ.get("WEBHOOK_SECRET")
+    metrics_listen = os.environ.get("METRICS_LISTEN")
+    stall_threshold = float(os.environ.get("STALL_THRESHOLD", "0.5"))
+    inventory_dump = os.environ.get("INVENTORY_DUMP")
+    inventory_index = os.environ.get("INVENTORY_INDEX")
+    profile_dir = os.environ.get("PROFILE_DIR")
+    throttle_chat = os.environ.get(
+        "THROTTLE_CHAT", mariusz.throttle.CHAT_LIMIT
+    )
+    throttle_user = os.environ.get(
+        "THROTTLE_USER", mariusz.throttle.USER_LIMIT
+    )
 
     if not api_key or not path_to_chat_db:
         raise ValueError(
             "Set API_KEY and SCIEZKA_DO_BAZY_CHATOW environment variables."
         )
 
-    m = Mariusz(api_key, path_to_chat_db, group_regex)
+    m = Mariusz(
+        api_key,
+        path_to_chat_db,
+        group_regex,
+        main_chat_id=int(os.environ["MAIN_CHAT_ID"]),
+        webhook_url=webhook_url,
+        webhook_listen=webhook_listen,
+        webhook_secret=webhook_secret,
+        metrics_listen=metrics_listen,
+        stall_threshold=stall_threshold,
+        inventory_dump=inventory_dump,
+        inventory_index=inventory_index,
+        throttle_chat=throttle_chat,
+        throttle_user=throttle_user,
+        profile_dir=profile_dir,
+    )
+    stop_on_signals([m])
     await m.run()
 
 
 if __name__ == "__main__":
-    asyncio.run(main(), debug=True)
+    # Debug mode is slow; set PYTHONASYNCIODEBUG=1 to turn it on when
+    # needed. Stalls are reported by the watchdog either way.
+    log_listener = mariusz.logs.setup()
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()
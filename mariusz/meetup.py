@@ -1,9 +1,19 @@
 """A module that prepares a message about our upcoming meetup's date and
 location."""
 
+from __future__ import annotations
+
+import asyncio
 import datetime
+import logging
+import re
+import time
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    import meetupscraper
 
-import meetupscraper
+LOGGER = logging.getLogger(__name__)
 
 DAY_NAMES = [
     "poniedziałek",
@@ -16,6 +26,11 @@ DAY_NAMES = [
 ]
 
 
+# The pinned message says the meetup is soon this long before it starts...
+SOON = datetime.timedelta(hours=3)
+# ...and moves on to the next meetup this long after it started.
+KEEP = datetime.timedelta(days=1)
+
 MONTH_NAMES = [
     "stycznia",
     "lutego",
@@ -41,20 +56,34 @@ def describe_date(date: datetime.datetime) -> str:
     )
 
 
-def prepare_meetup_message(group_regex: str | None = None) -> str:
-    """Prepares a message about the upcoming meetup."""
+def fetch_events(
+    group_regex: str | None = None,
+) -> list[meetupscraper.Event]:
+    """Scrapes meetup.com for our events. Blocks, so it should be run in an
+    executor when called from the event loop."""
+    # Imported here because it takes longer than the rest of the bot.
+    import meetupscraper  # pylint: disable=import-outside-toplevel
 
-    events = meetupscraper.get_upcoming_events(
-        "Hakierspejs-Łódź", name_regex=group_regex
+    return list(
+        meetupscraper.get_upcoming_events(
+            "Hakierspejs-Łódź", name_regex=group_regex
+        )
     )
+
+
+def build_meetup_message(
+    events: Iterable[meetupscraper.Event],
+    now: datetime.datetime | None = None,
+) -> str:
+    """Prepares a message about the upcoming meetup out of already scraped
+    events."""
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
     upcoming_events = sorted(
         [
             e
             for e in events
-            if (e.date + datetime.timedelta(days=1))
-            > datetime.datetime.now(datetime.timezone.utc).replace(
-                tzinfo=e.date.tzinfo
-            )
+            if (e.date + KEEP) > now.replace(tzinfo=e.date.tzinfo)
         ],
         key=lambda e: e.date,
     )
@@ -76,17 +105,143 @@ def prepare_meetup_message(group_regex: str | None = None) -> str:
         f"Więcej szczegółów: {next_meeting.url}"
     )
 
-    time_left = (
-        next_meeting.date
-        - datetime.datetime.now(datetime.timezone.utc).replace(
-            tzinfo=next_meeting.date.tzinfo
-        )
-    ).total_seconds()
-    if time_left < (60 * 60 * 3):
+    time_left = next_meeting.date - now.replace(
+        tzinfo=next_meeting.date.tzinfo
+    )
+    if time_left < SOON:
         ret = "Niedługo n" + ret[1:]
 
     return ret
 
 
+def seconds_until_change(
+    events: Iterable[meetupscraper.Event],
+    now: datetime.datetime | None = None,
+) -> float | None:
+    """Tells how long build_meetup_message() will keep returning the same
+    message for these events: until a meetup is about to start or until a
+    day after it, when the message moves on to the next one. Returns None
+    if it won't change."""
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    delays = [
+        (instant - now.replace(tzinfo=e.date.tzinfo)).total_seconds()
+        for e in events
+        for instant in (e.date - SOON, e.date + KEEP)
+    ]
+    return min((d for d in delays if d > 0), default=None)
+
+
+def prepare_meetup_message(group_regex: str | None = None) -> str:
+    """Prepares a message about the upcoming meetup."""
+    return build_meetup_message(fetch_events(group_regex))
+
+
+class MeetupRefresher:
+    """Keeps the last successfully scraped list of events, sorted by date.
+
+    get() never blocks: it returns whatever is cached, even if it is older
+    than `ttl` (stale-while-revalidate), and starts a scrape in an executor
+    in the background when needed. Failed scrapes are retried with an
+    exponential backoff, during which the stale list keeps being served.
+    A scrape that takes longer than `timeout` seconds counts as failed (the
+    scraper has no timeout of its own, so its thread is left behind)."""
+
+    def __init__(
+        self,
+        group_regex: str | None = None,
+        ttl: float = 3600.0,
+        timeout: float = 60.0,
+        min_backoff: float = 10.0,
+        max_backoff: float = 3600.0,
+        fetch: Callable[
+            [str | None], list[meetupscraper.Event]
+        ] = fetch_events,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.group_regex = group_regex
+        self.ttl = ttl
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.fetch = fetch
+        self.clock = clock
+        self.events: list[meetupscraper.Event] | None = None
+        self.fetched_at: float | None = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def is_stale(self) -> bool:
+        """Tells whether the cached events should be scraped again."""
+        return self.fetched_at is None or (
+            self.clock() - self.fetched_at >= self.ttl
+        )
+
+    def get(self) -> list[meetupscraper.Event] | None:
+        """Returns the cached events (None if we never managed to scrape
+        them) and schedules a refresh in the background if they are
+        stale."""
+        if self.is_stale() and self.clock() >= self.retry_at:
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self.refresh())
+        return self.events
+
+    async def refresh(self) -> None:
+        """Scrapes the events in an executor and updates the cache. Errors
+        are logged and only postpone the next attempt."""
+        loop = asyncio.get_running_loop()
+        try:
+            events = await asyncio.wait_for(
+                loop.run_in_executor(None, self.fetch, self.group_regex),
+                self.timeout,
+            )
+        except Exception:  # pylint: disable=broad-except
+            self.failures += 1
+            backoff = min(
+                self.min_backoff * 2 ** (self.failures - 1), self.max_backoff
+            )
+            self.retry_at = self.clock() + backoff
+            LOGGER.exception(
+                "MeetupRefresher: scrape #%d failed, retrying in %.0fs",
+                self.failures,
+                backoff,
+            )
+            return
+        self.events = sorted(events, key=lambda e: e.date)
+        self.fetched_at = self.clock()
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class MeetupFilter:
+    """Shows only the events of a shared MeetupRefresher whose titles match
+    `group_regex`, so that bots interested in different meetups can share
+    a single scrape."""
+
+    def __init__(
+        self, refresher: MeetupRefresher, group_regex: str | None = None
+    ) -> None:
+        self.refresher = refresher
+        self.regex = re.compile(group_regex) if group_regex else None
+        # Filtered once per scrape.
+        self._scraped: list[meetupscraper.Event] | None = None
+        self._events: list[meetupscraper.Event] = []
+
+    def get(self) -> list[meetupscraper.Event] | None:
+        """Same as MeetupRefresher.get(), but filtered."""
+        events = self.refresher.get()
+        if events is None or self.regex is None:
+            return events
+        if events is not self._scraped:
+            self._scraped = events
+            self._events = [e for e in events if self.regex.search(e.title)]
+        return self._events
+
+    async def refresh(self) -> None:
+        """Scrapes the events for all the bots sharing the refresher."""
+        await self.refresher.refresh()
+
+
 if __name__ == "__main__":
     print(prepare_meetup_message())
@@ -0,0 +1,257 @@
+"""In-process metrics, exposed in the Prometheus text format."""
+
+import asyncio
+import bisect
+import logging
+import math
+import time
+from typing import Callable, Iterable
+
+import mariusz.httpd
+
+LOGGER = logging.getLogger(__name__)
+
+Labels = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        name = f"{name}{{{inner}}}"
+    return f"{name} {value:g}"
+
+
+class Counter:
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str) -> None:
+        self.name = name
+        self.doc = doc
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        """Increases the counter for the given labels."""
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0.0) + value
+
+    def get(self, **labels: str) -> float:
+        """Returns the current value for the given labels."""
+        return self.values.get(_labels(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        """Lines of the text exposition format."""
+        for labels, value in sorted(self.values.items()):
+            yield _format(self.name, labels, value)
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram:
+    """Counts observations (e.g. durations in seconds) in buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, doc: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        self.buckets = buckets
+        self.series: dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Records a single observation."""
+        key = _labels(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _HistogramSeries(len(self.buckets))
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series.counts[index] += 1
+        series.count += 1
+        series.sum += value
+        series.max = max(series.max, value)
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager that observes how long its body took."""
+        return _Timer(self, labels)
+
+    def describe(self, **labels: str) -> str:
+        """A short human-readable summary of the observations."""
+        series = self.series.get(_labels(labels))
+        if series is None:
+            return "brak danych"
+        return (
+            f"{series.count}x, średnio {series.sum / series.count:.3f}s,"
+            f" p95 ≤{self.quantile(0.95, **labels):g}s,"
+            f" max {series.max:.3f}s"
+        )
+
+    def quantile(self, q: float, **labels: str) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls
+        into (so it's an upper estimate)."""
+        series = self.series.get(_labels(labels))
+        if series is None or not series.count:
+            return math.nan
+        rank = q * series.count
+        seen = 0
+        for bound, count in zip(self.buckets, series.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return series.max
+
+    def samples(self) -> Iterable[str]:
+        """Lines of the text exposition format."""
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                yield _format(
+                    self.name + "_bucket",
+                    labels + (("le", f"{bound:g}"),),
+                    cumulative,
+                )
+            yield _format(
+                self.name + "_bucket", labels + (("le", "+Inf"),), series.count
+            )
+            yield _format(self.name + "_sum", labels, series.sum)
+            yield _format(self.name + "_count", labels, series.count)
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict[str, str]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, **self.labels)
+
+
+class Gauge:
+    """A value computed when metrics are collected."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        collect: Callable[[], Iterable[tuple[dict[str, str], float]]],
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        """Lines of the text exposition format."""
+        for labels, value in self.collect():
+            if value is not None:
+                yield _format(self.name, _labels(labels), value)
+
+
+class Registry:
+    """All the metrics of a bot."""
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def counter(self, name: str, doc: str) -> Counter:
+        """Returns the counter with the given name, creating it if needed."""
+        return self._get(name, lambda: Counter(name, doc))
+
+    def histogram(
+        self, name: str, doc: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Returns the histogram with the given name, creating it if
+        needed."""
+        return self._get(name, lambda: Histogram(name, doc, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        doc: str,
+        collect: Callable[[], Iterable[tuple[dict[str, str], float]]],
+    ) -> Gauge:
+        """Registers a gauge whose values are computed by `collect`."""
+        gauge = Gauge(name, doc, collect)
+        self.metrics[name] = gauge
+        return gauge
+
+    def register(self, metric: Counter | Histogram | Gauge) -> None:
+        """Adds a metric that is shared with another registry."""
+        self.metrics[metric.name] = metric
+
+    def _get(self, name, factory):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = factory()
+        return metric
+
+    def render(self) -> str:
+        """Renders all the metrics in the Prometheus text format."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.doc}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Registry: collecting %s failed", name)
+        return "\n".join(lines) + "\n"
+
+    async def handle(
+        self, request: mariusz.httpd.Request
+    ) -> mariusz.httpd.Response:
+        """Serves GET /metrics."""
+        if request.path != "/metrics":
+            return mariusz.httpd.Response(404)
+        if request.method != "GET":
+            return mariusz.httpd.Response(405)
+        return mariusz.httpd.Response(
+            body=self.render().encode(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    async def serve(self, host: str, port: int) -> asyncio.Server:
+        """Starts the /metrics endpoint."""
+        LOGGER.info("Registry: serving metrics on %s:%d", host, port)
+        return await mariusz.httpd.serve(self.handle, host, port)
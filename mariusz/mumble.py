@@ -1,23 +1,105 @@
 """Module that provides Mumble-related logic."""
 
-import struct
-import socket
+import asyncio
 import logging
+import os
+import struct
+from typing import NamedTuple
 
 LOGGER = logging.getLogger(__name__)
 
+MUMBLE_PORT = 64738
+
+# Ping request: four zero bytes (request type) followed by an 8-byte
+# identifier that the server echoes back.
+# Reply: version, identifier, users, max users, allowed bandwidth.
+_REPLY = struct.Struct(">I8sIII")
+
 
-def get_mumble_user_count(mumble_server: str) -> int:
-    """Sends a PING to a given Mumble server and returns the number of
-    Mumble users that are currently online. Returns zero on error."""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect((mumble_server, 64738))
-        s.send(b"\x00\x00\x00\x00abcdefgh")
-        x = s.recv(1024)
-        return int(
-            struct.unpack(">xxxx" + "x" * len("abcdefgh") + "I" * 3, x)[0]
+class MumbleStatus(NamedTuple):
+    """What a Mumble server says about itself in a ping reply."""
+
+    users: int
+    max_users: int
+    bandwidth: int
+
+
+class _PingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, ident: bytes) -> None:
+        self.ident = ident
+        self.reply: asyncio.Future[MumbleStatus] = (
+            asyncio.get_running_loop().create_future()
         )
-    except socket.error as e:
-        LOGGER.error("get_mumble_user_count: %r", e)
-        return 0
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if self.reply.done() or len(data) < _REPLY.size:
+            return
+        _version, ident, users, max_users, bandwidth = _REPLY.unpack_from(data)
+        if ident != self.ident:
+            return  # a late reply to one of the previous attempts
+        self.reply.set_result(MumbleStatus(users, max_users, bandwidth))
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.reply.done():
+            self.reply.set_exception(exc)
+
+
+async def ping(
+    mumble_server: str,
+    port: int = MUMBLE_PORT,
+    timeout: float = 2.0,
+    retries: int = 3,
+) -> MumbleStatus | None:
+    """Sends a PING to a given Mumble server and returns its status. UDP
+    packets can get lost, so the ping is repeated up to `retries` times,
+    waiting `timeout` seconds for each reply. Returns None on error."""
+    loop = asyncio.get_running_loop()
+    for attempt in range(1, retries + 1):
+        ident = os.urandom(8)
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _PingProtocol(
+                    ident
+                ),  # pylint: disable=cell-var-from-loop
+                remote_addr=(mumble_server, port),
+            )
+        except OSError as e:
+            LOGGER.error("ping(%r): %r", mumble_server, e)
+            return None
+        try:
+            transport.sendto(b"\x00\x00\x00\x00" + ident)
+            return await asyncio.wait_for(protocol.reply, timeout)
+        except asyncio.TimeoutError:
+            LOGGER.debug(
+                "ping(%r): no reply, attempt %d/%d",
+                mumble_server,
+                attempt,
+                retries,
+            )
+        except OSError as e:
+            LOGGER.error("ping(%r): %r", mumble_server, e)
+            return None
+        finally:
+            transport.close()
+    LOGGER.error(
+        "ping(%r): no reply after %d attempts", mumble_server, retries
+    )
+    return None
+
+
+async def ping_many(
+    mumble_servers: list[tuple[str, int]], **kwargs
+) -> dict[tuple[str, int], MumbleStatus | None]:
+    """Pings several (host, port) servers concurrently. Accepts the same
+    keyword arguments as ping(), other than the port."""
+    statuses = await asyncio.gather(
+        *(ping(host, port, **kwargs) for host, port in mumble_servers)
+    )
+    return dict(zip(mumble_servers, statuses))
+
+
+async def get_mumble_user_count(mumble_server: str, **kwargs) -> int:
+    """Returns the number of Mumble users that are currently online. Returns
+    zero on error."""
+    status = await ping(mumble_server, **kwargs)
+    return status.users if status else 0
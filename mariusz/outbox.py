@@ -0,0 +1,145 @@
+"""Notifications to chats that are sent in batches, without repeats."""
+
+import logging
+import sqlite3
+import time
+from typing import Callable, Iterable
+
+import mariusz.broadcast
+
+LOGGER = logging.getLogger(__name__)
+
+Combine = Callable[[list[str]], str]
+
+
+def join(header: str, limit: int = 10) -> Combine:
+    """Returns a function that turns several notifications into one
+    message: the header (with {n} replaced by their number) followed by at
+    most `limit` of them. A single notification is sent as it is."""
+
+    def combine(texts: list[str]) -> str:
+        if len(texts) == 1:
+            return texts[0]
+        message = header.format(n=len(texts)) + "\n\n"
+        message += "\n\n".join(texts[:limit])
+        if len(texts) > limit:
+            message += f"\n\n…i jeszcze {len(texts) - limit}"
+        return message
+
+    return combine
+
+
+def latest(texts: list[str]) -> str:
+    """Sends only the most recent notification, e.g. for state changes
+    where only the current state matters."""
+    return texts[-1]
+
+
+class Outbox:
+    """Notifications waiting to be sent, stored in the chat database so
+    that they survive restarts.
+
+    Notifications of the same kind for the same chat are sent together,
+    as one message built by the kind's `combine` function, once the oldest
+    of them has waited for its window. A message identical to the last one
+    sent to the chat is dropped."""
+
+    def __init__(
+        self,
+        db: sqlite3.Connection,
+        broadcaster: mariusz.broadcast.Broadcaster,
+        combine: dict[str, Combine] | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db = db
+        self.broadcaster = broadcaster
+        self.combine = combine or {}
+        self.clock = clock
+        self.last_sent: dict[int, str] = dict(
+            db.execute("SELECT chat_id, text FROM last_sent")
+        )
+        self.duplicates = 0
+
+    def put(
+        self,
+        chat_ids: Iterable[int],
+        kind: str,
+        text: str,
+        window: float = 60.0,
+    ) -> None:
+        """Queues a notification for the chats. It's sent at the latest
+        `window` seconds from now, along with other notifications of the
+        same kind."""
+        due = self.clock() + window
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO outbox(chat_id, kind, text, due)"
+                " SELECT ?1, ?2, ?3, ?4 WHERE NOT EXISTS ("
+                "   SELECT 1 FROM outbox"
+                "   WHERE chat_id = ?1 AND kind = ?2 AND text = ?3"
+                ")",
+                [(chat_id, kind, text, due) for chat_id in chat_ids],
+            )
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _due(self) -> dict[str, tuple[list[int], list[int]]]:
+        """Builds the messages that are due: message -> (IDs of the queued
+        notifications, chats to send it to)."""
+        rows = self.db.execute(
+            "SELECT id, chat_id, kind, text FROM outbox"
+            " WHERE (chat_id, kind) IN ("
+            "   SELECT chat_id, kind FROM outbox"
+            "   GROUP BY chat_id, kind HAVING MIN(due) <= ?"
+            " ) ORDER BY id",
+            (self.clock(),),
+        )
+        groups: dict[tuple[int, str], tuple[list[int], list[str]]] = {}
+        for row_id, chat_id, kind, text in rows:
+            ids, texts = groups.setdefault((chat_id, kind), ([], []))
+            ids.append(row_id)
+            texts.append(text)
+        messages: dict[str, tuple[list[int], list[int]]] = {}
+        for (chat_id, kind), (ids, texts) in groups.items():
+            combine = self.combine.get(kind, "\n\n".join)
+            message = combine(texts)
+            row_ids, chat_ids = messages.setdefault(message, ([], []))
+            row_ids.extend(ids)
+            if self.last_sent.get(chat_id) == message:
+                self.duplicates += 1
+                LOGGER.debug("Outbox: dropping a repeat to %d", chat_id)
+            else:
+                chat_ids.append(chat_id)
+        return messages
+
+    async def flush(self) -> int:
+        """Sends the notifications that are due. Returns the number of
+        messages sent."""
+        sent = 0
+        for message, (row_ids, chat_ids) in self._due().items():
+            delivered = []
+            if chat_ids:
+                report = await self.broadcaster.send_message(chat_ids, message)
+                delivered = [(d.chat_id, message) for d in report.sent]
+                for delivery in report.failed:
+                    LOGGER.warning(
+                        "Outbox: giving up on %d: %r",
+                        delivery.chat_id,
+                        delivery.error,
+                    )
+            # Failed deliveries were already retried by the broadcaster;
+            # they aren't kept, so that a chat that kicked us out doesn't
+            # block the queue.
+            with self.db:
+                self.db.executemany(
+                    "DELETE FROM outbox WHERE id = ?",
+                    [(row_id,) for row_id in row_ids],
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO last_sent VALUES (?, ?)",
+                    delivered,
+                )
+            self.last_sent.update(delivered)
+            sent += len(delivered)
+        return sent
@@ -0,0 +1,144 @@
+"""A sampling profiler that can be started in the running bot, without
+restarting it under a profiler."""
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from types import FrameType
+
+Stack = tuple[str, ...]
+
+# Where threads sit when they have nothing to do: the event loop waiting
+# for I/O and executor or helper threads waiting for work. Such samples
+# only show up in collapsed stacks, not in top().
+IDLE = (
+    ("select", "selectors.py"),
+    ("wait", "threading.py"),
+    ("_worker", "thread.py"),
+    ("get", "queue.py"),
+)
+
+
+def _function(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(function: str) -> bool:
+    return any(function.startswith(f"{n} ({f}:") for n, f in IDLE)
+
+
+def _stack(frame: FrameType | None) -> list[str]:
+    """Functions on the stack, outermost first."""
+    stack = []
+    while frame is not None:
+        stack.append(_function(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Profile:
+    """Stack samples of all the threads taken over `duration` seconds."""
+
+    def __init__(self) -> None:
+        self.stacks: collections.Counter[Stack] = collections.Counter()
+        self.samples = 0
+        self.duration = 0.0
+
+    def add(self, thread_name: str, frame: FrameType) -> None:
+        """Records the current stack of a thread."""
+        self.stacks[(thread_name, *_stack(frame))] += 1
+
+    def top(self, n: int = 10) -> list[tuple[str, int, int]]:
+        """The `n` functions that were on the stack most often while their
+        thread was busy, as (function, samples in the function itself,
+        samples in the function and what it called)."""
+        own: collections.Counter[str] = collections.Counter()
+        total: collections.Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            if _is_idle(stack[-1]):
+                continue
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                total[function] += count
+        return [
+            (function, own[function], count)
+            for function, count in total.most_common(n)
+        ]
+
+    def idle(self, thread_name: str) -> float:
+        """The fraction of samples in which the thread had nothing to do."""
+        idle = sum(
+            count
+            for stack, count in self.stacks.items()
+            if stack[0] == thread_name and _is_idle(stack[-1])
+        )
+        return idle / max(self.samples, 1)
+
+    def collapsed(self) -> str:
+        """The samples in the collapsed stack format of flamegraph.pl and
+        speedscope: one line per stack, frames separated by semicolons and
+        followed by the number of samples."""
+        return "".join(
+            ";".join(stack) + f" {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+
+class SamplingProfiler:
+    """Samples the stacks of all the threads (the event loop and the
+    executors alike) from a separate thread, every `interval` seconds.
+    Nothing is hooked into the code being profiled, so the overhead is
+    that of the sampling thread alone."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.running = False
+
+    def _sample(self, profile: Profile, stop: threading.Event) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()  # pylint: disable=W0212
+            for thread_id, frame in frames.items():
+                if thread_id == me:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                profile.add(names.get(thread_id, str(thread_id)), frame)
+            profile.samples += 1
+
+    async def profile(self, seconds: float) -> Profile:
+        """Samples the process for `seconds`. Only one profile can be taken
+        at a time; raises RuntimeError if another one is running."""
+        if self.running:
+            raise RuntimeError("The profiler is already running.")
+        self.running = True
+        profile = Profile()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._sample,
+            args=(profile, stop),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        started = time.monotonic()
+        thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            thread.join()
+            self.running = False
+        profile.duration = time.monotonic() - started
+        return profile
+
+
+# One per process: bots running together (see mariusz.main.run_many())
+# would otherwise sample the same threads at the same time.
+PROFILER = SamplingProfiler()
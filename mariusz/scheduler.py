@@ -0,0 +1,175 @@
+"""Runs periodic and one-shot background jobs."""
+
+import asyncio
+import dataclasses
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+LOGGER = logging.getLogger(__name__)
+
+JobFunction = Callable[[], Awaitable[None]]
+
+
+@dataclasses.dataclass
+class Job:
+    """A job and the statistics of its runs. Times are time.monotonic()."""
+
+    name: str
+    func: JobFunction
+    interval: float | None = None  # None for one-shot jobs
+    jitter: float = 0.0
+    timeout: float | None = None
+    next_run: float | None = None
+    last_run: float | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    running: bool = False
+
+
+class Scheduler:
+    """Keeps the jobs in a heap ordered by their next run and sleeps until
+    the earliest one is due.
+
+    Each run is a separate task with an optional timeout; exceptions are
+    logged and counted, but never propagate out of run(). Periodic jobs are
+    scheduled at a fixed rate (plus random jitter); if a run is still going
+    when the next one is due, the next one is skipped rather than started
+    concurrently."""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, Job] = {}
+        self.heap: list[tuple[float, int, Job]] = []
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.tasks: set[asyncio.Task[None]] = set()
+
+    def _push(self, job: Job, when: float) -> None:
+        job.next_run = when
+        heapq.heappush(self.heap, (when, next(self.counter), job))
+        self.wakeup.set()
+
+    def every(
+        self,
+        interval: float,
+        func: JobFunction,
+        name: str | None = None,
+        jitter: float = 0.0,
+        timeout: float | None = None,
+        delay: float = 0.0,
+    ) -> Job:
+        """Runs func every `interval` seconds, starting after `delay`."""
+        job = Job(name or func.__name__, func, interval, jitter, timeout)
+        self.cancel(job.name)
+        self.jobs[job.name] = job
+        self._push(job, time.monotonic() + delay)
+        return job
+
+    def once(
+        self,
+        delay: float,
+        func: JobFunction,
+        name: str | None = None,
+        timeout: float | None = None,
+    ) -> Job:
+        """Runs func once, after `delay` seconds. Scheduling a job with the
+        name of a pending one replaces it."""
+        job = Job(name or func.__name__, func, timeout=timeout)
+        self.cancel(job.name)
+        self.jobs[job.name] = job
+        self._push(job, time.monotonic() + max(delay, 0.0))
+        return job
+
+    def cancel(self, name: str) -> None:
+        """Forgets about a job. A run that's already going isn't
+        interrupted."""
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            job.next_run = None
+
+    async def run(self) -> None:
+        """Runs the jobs forever."""
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            when, _, job = heapq.heappop(self.heap)
+            if job.next_run != when:
+                continue  # cancelled or rescheduled
+            if job.interval is not None:
+                jitter = random.uniform(0, job.jitter) if job.jitter else 0.0
+                # Don't try to catch up on runs missed while we were late.
+                due = max(when + job.interval, time.monotonic())
+                self._push(job, due + jitter)
+            else:
+                job.next_run = None
+                if self.jobs.get(job.name) is job:
+                    del self.jobs[job.name]
+            if job.running:
+                job.skipped += 1
+                LOGGER.warning("Scheduler: %s is still running", job.name)
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _execute(self, job: Job) -> None:
+        job.running = True
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(job.func(), job.timeout)
+            job.last_error = None
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.last_error = f"timed out after {job.timeout}s"
+            LOGGER.error("Scheduler: %s %s", job.name, job.last_error)
+        except Exception as e:  # pylint: disable=broad-except
+            job.failures += 1
+            job.last_error = repr(e)
+            LOGGER.exception("Scheduler: %s failed", job.name)
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_run = started
+            job.last_duration = time.monotonic() - started
+
+    async def join(self) -> None:
+        """Waits for the runs that are already going to finish."""
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> list[dict]:
+        """Describes the jobs: seconds until the next run, seconds since the
+        last one started and how long it took."""
+        now = time.monotonic()
+        return [
+            {
+                "name": job.name,
+                "next_run_in": (
+                    None if job.next_run is None else job.next_run - now
+                ),
+                "last_run_ago": (
+                    None if job.last_run is None else now - job.last_run
+                ),
+                "last_duration": job.last_duration,
+                "runs": job.runs,
+                "failures": job.failures,
+                "skipped": job.skipped,
+                "last_error": job.last_error,
+            }
+            for job in self.jobs.values()
+        ]
@@ -0,0 +1,77 @@
+"""Outside data that all the bots in a process share: meetup events, wiki
+changes and the state of the Mumble server. Each is fetched once, however
+many bots are interested in it."""
+
+import logging
+from typing import Protocol
+
+import httpx
+
+import mariusz.meetup
+import mariusz.mumble
+import mariusz.wiki
+
+LOGGER = logging.getLogger(__name__)
+
+MUMBLE_SERVER = "hs-ldz.pl"
+
+
+class Subscriber(Protocol):
+    """What a bot needs to implement to get the news."""
+
+    def on_wiki_entries(self, entries: list[mariusz.wiki.WikiEntry]) -> None:
+        """Called with the wiki changes since the previous poll."""
+
+    def on_mumble_status(self, status: mariusz.mumble.MumbleStatus) -> None:
+        """Called with every answer from the Mumble server."""
+
+
+class SharedSources:
+    """Polls the wiki and Mumble on behalf of all the subscribed bots and
+    keeps a single meetup scraper whose results each bot filters by its own
+    group regex."""
+
+    def __init__(
+        self,
+        mumble_server: str = MUMBLE_SERVER,
+        mumble_port: int = mariusz.mumble.MUMBLE_PORT,
+    ) -> None:
+        self.mumble_server = mumble_server
+        self.mumble_port = mumble_port
+        self.meetup_refresher = mariusz.meetup.MeetupRefresher()
+        self.wiki = mariusz.wiki.WikiWatcher()
+        self.subscribers: list[Subscriber] = []
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        """Starts passing wiki and Mumble news to the subscriber."""
+        self.subscribers.append(subscriber)
+
+    def meetup(self, group_regex: str | None) -> mariusz.meetup.MeetupFilter:
+        """The events whose titles match group_regex."""
+        return mariusz.meetup.MeetupFilter(self.meetup_refresher, group_regex)
+
+    async def poll_wiki(self) -> None:
+        """Checks the wiki for changes and passes them on."""
+        try:
+            entries = await self.wiki.poll()
+        except httpx.HTTPError as e:
+            LOGGER.warning("poll_wiki(): %r", e)
+            return
+        if not entries:
+            return
+        for subscriber in self.subscribers:
+            subscriber.on_wiki_entries(entries)
+
+    async def poll_mumble(self) -> None:
+        """Pings the Mumble server and passes its status on."""
+        status = await mariusz.mumble.ping(
+            self.mumble_server, self.mumble_port
+        )
+        if status is None:
+            return  # don't report a lost packet as everybody leaving
+        for subscriber in self.subscribers:
+            subscriber.on_mumble_status(status)
+
+    async def aclose(self) -> None:
+        """Closes the connections."""
+        await self.wiki.aclose()
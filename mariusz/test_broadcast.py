@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+import telegram
+
+from .broadcast import Broadcaster, TokenBucket
+from .fakes import FakeClock
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertAlmostEqual(bucket.try_take(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.try_take(), 0)
+        self.assertAlmostEqual(bucket.try_take(), 0.5)
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+        return chat_id
+
+
+class TestBroadcaster(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_and_report(self):
+        bot = FakeBot(errors={3: [telegram.error.Forbidden("blocked")]})
+        broadcaster = Broadcaster(bot, concurrency=4)
+        report = await broadcaster.send_message(range(1, 11), "hej")
+        self.assertEqual(len(bot.sent), 9)
+        self.assertEqual(bot.max_in_flight, 4)
+        self.assertEqual([d.chat_id for d in report.failed], [3])
+        self.assertEqual(report.sent[0].result, 1)
+
+    async def test_retry_after(self):
+        bot = FakeBot(errors={-5: [telegram.error.RetryAfter(0)]})
+        broadcaster = Broadcaster(bot, group_chat_rate=1000.0)
+        with self.assertLogs("mariusz.broadcast", "WARNING"):
+            report = await broadcaster.send_message([-5], "hej")
+        self.assertEqual(report.failed, [])
+        self.assertEqual(bot.sent, [(-5, "hej")])
+
+    async def test_gives_up_after_retries(self):
+        errors = [telegram.error.RetryAfter(0) for _ in range(3)]
+        bot = FakeBot(errors={7: errors})
+        broadcaster = Broadcaster(bot, max_retries=2, private_chat_rate=1e3)
+        with self.assertLogs("mariusz.broadcast", "WARNING"):
+            report = await broadcaster.send_message([7], "hej")
+        self.assertIsInstance(
+            report.failed[0].error, telegram.error.RetryAfter
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from .chatdb import ChatDb
+from .fakes import FakeClock
+
+
+class TestChatDb(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "baza.sqlite")
+
+    def stored(self):
+        db = sqlite3.connect(self.path)
+        try:
+            return {r[0] for r in db.execute("SELECT chat_id FROM chats")}
+        finally:
+            db.close()
+
+    def test_migrates_old_schema(self):
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE chat_ids (chat_id TEXT)")
+        db.executemany(
+            "INSERT INTO chat_ids VALUES (?)", [("-100",), ("5",), ("5",)]
+        )
+        db.commit()
+        db.close()
+
+        chat_db = ChatDb(self.path)
+        self.assertEqual(list(chat_db.list()), [-100, 5])
+        self.assertEqual(chat_db.groups(), [-100])
+        chat_db.close()
+        self.assertEqual(self.stored(), {-100, 5})
+
+    def test_batches_writes(self):
+        clock = FakeClock()
+        chat_db = ChatDb(self.path, batch_size=3, clock=clock)
+        chat_db.insert(1)
+        chat_db.insert(2)
+        chat_db.insert(2)
+        self.assertEqual(list(chat_db.list()), [1, 2])
+        self.assertEqual(self.stored(), set())
+
+        chat_db.insert(3)
+        self.assertEqual(self.stored(), {1, 2, 3})
+
+        chat_db.insert(4)
+        chat_db.maybe_flush()
+        self.assertEqual(self.stored(), {1, 2, 3})
+        clock.now = chat_db.flush_interval
+        chat_db.maybe_flush()
+        self.assertEqual(self.stored(), {1, 2, 3, 4})
+        chat_db.close()
+
+    def test_reopen(self):
+        chat_db = ChatDb(self.path)
+        chat_db.insert(-7, chat_type="supergroup", title="HS")
+        chat_db.set_pinned(-7, "Nast. spotkanie", 42)
+        chat_db.close()
+
+        chat_db = ChatDb(self.path)
+        self.assertEqual(list(chat_db.list()), [-7])
+        chat = chat_db.get(-7)
+        self.assertEqual(chat.title, "HS")
+        self.assertEqual(chat.pinned_text, "Nast. spotkanie")
+        self.assertEqual(chat.pinned_message_id, 42)
+        chat_db.close()
+
+    def test_queries(self):
+        chat_db = ChatDb(self.path)
+        chat_db.insert(-1, chat_type="group", last_seen=time.time())
+        chat_db.insert(-2, chat_type="supergroup", last_seen=1.0)
+        chat_db.insert(3, chat_type="private", last_seen=time.time())
+        chat_db.insert(-1)  # type is remembered
+        self.assertEqual(chat_db.groups(), [-2, -1])
+        self.assertEqual(chat_db.active_since(days=7), [-1, 3])
+        chat_db.close()
+
+    def test_update_offset(self):
+        clock = FakeClock()
+        chat_db = ChatDb(self.path, clock=clock)
+        self.assertIsNone(chat_db.update_offset)
+        chat_db.set_update_offset(1000)
+        chat_db.set_update_offset(1001)
+        self.assertIsNone(ChatDb(self.path).update_offset)
+
+        clock.now = chat_db.flush_interval
+        chat_db.maybe_flush()
+        self.assertEqual(ChatDb(self.path).update_offset, 1001)
+        chat_db.close()
+
+    def test_unfinished_updates(self):
+        chat_db = ChatDb(self.path)
+        chat_db.save_unfinished({12: '{"update_id": 12}', 11: "{}"})
+        chat_db.close()
+        chat_db = ChatDb(self.path)
+        self.assertEqual(
+            chat_db.take_unfinished(), ["{}", '{"update_id": 12}']
+        )
+        self.assertEqual(chat_db.take_unfinished(), [])
+        chat_db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
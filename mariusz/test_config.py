@@ -0,0 +1,50 @@
+import unittest
+
+from parameterized import parameterized
+
+from .config import parse
+
+CONFIG = """
+[defaults]
+metrics_listen = "127.0.0.1:9100"
+
+[[bot]]
+api_key = "1:a"
+path_to_chat_db = "/a.sqlite"
+main_chat_id = -1
+
+[[bot]]
+api_key = "2:b"
+path_to_chat_db = "/b.sqlite"
+main_chat_id = -2
+group_regex = "Cryptoparty"
+metrics_listen = "127.0.0.1:9101"
+"""
+
+BOT = 'api_key = "1:a"\\npath_to_chat_db = "/a.sqlite"\\nmain_chat_id = -1\\n'
+
+
+class TestConfig(unittest.TestCase):
+    def test_parse(self):
+        first, second = parse(CONFIG)
+        self.assertEqual(first["api_key"], "1:a")
+        self.assertEqual(first["metrics_listen"], "127.0.0.1:9100")
+        self.assertEqual(first["throttle_chat"], "3/60")
+        self.assertEqual(second["group_regex"], "Cryptoparty")
+        self.assertEqual(second["metrics_listen"], "127.0.0.1:9101")
+
+    @parameterized.expand(
+        [
+            ("no bots", ""),
+            ("missing key", '[[bot]]\\napi_key = "1:a"\\n'),
+            ("unknown key", "[[bot]]\\n" + BOT + "color = 1\\n"),
+            ("same token", "[[bot]]\\n" + BOT + "[[bot]]\\n" + BOT),
+        ]
+    )
+    def test_invalid(self, _, text):
+        with self.assertRaises(ValueError):
+            parse(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
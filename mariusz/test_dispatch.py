@@ -0,0 +1,82 @@
+import unittest
+import parameterized
+
+from .dispatch import Dispatcher, compile_triggers
+from .text import fold
+
+TRIGGERS = [
+    {"Łódź", "Łodzi", "łódzkie"},
+    {"\\.wersja"},
+    {"jeszcze jak"},
+    {"czy mamy", "mamy może"},
+    {"\\.corobic"},
+    {"\\.co"},
+    {"\\.help", "\\.pomoc"},
+    {"\\.czy"},
+    {"[0-9]+ zł"},
+    {"\\Sa\\W"},
+]
+
+
+def build():
+    dispatcher = Dispatcher()
+    naive = {}
+    for index, text in enumerate(TRIGGERS):
+        regex = compile_triggers(text)
+        dispatcher[regex] = index
+        naive[regex] = index
+    return dispatcher, naive
+
+
+class TestDispatcher(unittest.TestCase):
+    @parameterized.parameterized.expand(
+        [
+            ("Łódź jest super", [0]),
+            ("łÓDŹ", [0]),
+            ("Lodz", [0]),
+            ("lodzkie klimaty", [0]),
+            ("byłem w Łodzi", []),
+            (".wersja", [1]),
+            (".WERSJA proszę", [1]),
+            ("a .wersja", []),
+            (".corobic", [4, 5]),
+            (".co", [5]),
+            (".czy", [7]),
+            ("czy mamy miarkę?", [3]),
+            (".pomoc", [6]),
+            ("100 zł", [8]),
+            ("ŁA!", [9]),
+            (" a!", []),
+            ("", []),
+        ]
+    )
+    def test_matches_like_a_loop(self, text, expected):
+        dispatcher, naive = build()
+        text = fold(text)
+        self.assertEqual(dispatcher.match(text), expected)
+        self.assertEqual(
+            [f for r, f in naive.items() if r.match(text)], expected
+        )
+
+    def test_folds_triggers(self):
+        self.assertEqual(
+            compile_triggers({"Łódź", "Lodz", "\\.Wersja"}).pattern,
+            "^\\.wersja|lodz",
+        )
+
+    def test_keeps_regex_escapes(self):
+        self.assertEqual(
+            compile_triggers({"\\Słó\\W\\D", "\\.Wersja"}).pattern,
+            "\\Slo\\W\\D|^\\.wersja",
+        )
+
+    def test_registration_after_match(self):
+        dispatcher, _ = build()
+        self.assertEqual(dispatcher.match(".nowe"), [])
+        dispatcher[compile_triggers({"\\.nowe"})] = 9
+        self.assertEqual(dispatcher.match(".nowe"), [9])
+        self.assertEqual(len(dispatcher), len(TRIGGERS) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
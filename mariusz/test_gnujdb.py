@@ -30,6 +30,19 @@ class TestCzyMamyGnuj(unittest.TestCase):
                 "Mamy może miarkę w spejsie?",
                 "https://g.hs-ldz.pl/search?query=miark%C4%99",
             ),
+            (
+                "Czy jest w hsie miarka?",
+                "https://g.hs-ldz.pl/search?query=miarka",
+            ),
+            ("Czy mamy w hsbc konto?", None),
+            (
+                "Czy mamy jakiś  oscyloskop w hackerspejsie?",
+                "https://g.hs-ldz.pl/search?query=oscyloskop",
+            ),
+            (
+                "Mamy może w spejsie zamamy?",
+                "https://g.hs-ldz.pl/search?query=zamamy",
+            ),
         ]
     )
     def test_method(self, message, result):
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+
+import parameterized
+
+from .inventory import Inventory, Item
+from .text import search_terms
+
+ITEMS = [
+    {"id": 1, "name": "Miarka zwijana 5m", "url": "https://example.com/1"},
+    {"id": 2, "name": "Nożyce do metalu"},
+    {"id": 3, "name": "Lutownica", "description": "stacja lutownicza"},
+    {"id": 4, "name": "Łódka z papieru"},
+]
+
+
+class TestSearchTerms(unittest.TestCase):
+    @parameterized.parameterized.expand(
+        [
+            ("miarkę", ["miark"]),
+            ("Miarka", ["miark"]),
+            ("miarki", ["miark"]),
+            ("Nożyce do metalu", ["nozyc", "do", "metal"]),
+            ("ŁÓDŹ", ["lodz"]),
+            ("pickit 2", ["pickit", "2"]),
+        ]
+    )
+    def test_search_terms(self, text, terms):
+        self.assertEqual(search_terms(text), terms)
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dump = os.path.join(tmpdir.name, "dump.jsonl")
+        self.write_dump(ITEMS)
+        self.inventory = Inventory(os.path.join(tmpdir.name, "index.sqlite"))
+        self.addCleanup(self.inventory.close)
+
+    def write_dump(self, items):
+        with open(self.dump, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        # Make sure the new contents are noticed even within a single tick
+        # of the file system's clock.
+        stat = os.stat(self.dump)
+        mtime = getattr(self, "mtime", stat.st_mtime_ns) + 1
+        os.utime(self.dump, ns=(mtime, mtime))
+        self.mtime = mtime
+
+    def names(self, query):
+        return [item.name for item in self.inventory.search(query)]
+
+    @parameterized.parameterized.expand(
+        [
+            ("miarkę", ["Miarka zwijana 5m"]),
+            ("nozyce", ["Nożyce do metalu"]),
+            ("nożyc do blachy", ["Nożyce do metalu"]),
+            ("stację lutowniczą", ["Lutownica"]),
+            ("łódkę", ["Łódka z papieru"]),
+            ("pickit 2", []),
+            ("coś z metalu", ["Nożyce do metalu"]),
+            ("coś do jedzenia", []),
+            ("jakiś z do w", []),
+            ("", []),
+        ]
+    )
+    def test_search(self, query, names):
+        self.inventory.load(self.dump)
+        self.assertEqual(self.names(query), names)
+
+    def test_returns_items(self):
+        self.inventory.load(self.dump)
+        self.assertEqual(
+            self.inventory.search("miarka"),
+            [Item("1", "Miarka zwijana 5m", None, "https://example.com/1")],
+        )
+
+    def test_incremental_load(self):
+        self.assertEqual(self.inventory.load(self.dump), 4)
+        self.assertEqual(self.inventory.load(self.dump), 0)
+        items = ITEMS[1:] + [{"id": 5, "name": "Oscyloskop"}]
+        items[0] = {"id": 2, "name": "Nożyce do blachy"}
+        self.write_dump(items)
+        self.assertEqual(self.inventory.load(self.dump), 3)
+        self.assertEqual(len(self.inventory), 4)
+        self.assertEqual(self.names("miarka"), [])
+        self.assertEqual(self.names("metalu"), [])
+        self.assertEqual(self.names("nozyce do blachy"), ["Nożyce do blachy"])
+        self.assertEqual(self.names("oscyloskopu"), ["Oscyloskop"])
+
+
+if __name__ == "__main__":
+    unittest.main()
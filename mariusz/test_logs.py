@@ -0,0 +1,61 @@
+import io
+import logging
+import unittest
+
+from .logs import SampleFilter, parse_levels, setup
+
+
+class TestParseLevels(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_levels("info, mariusz.chatdb=DEBUG,httpx=warning,"),
+            {"": "INFO", "mariusz.chatdb": "DEBUG", "httpx": "WARNING"},
+        )
+
+
+class TestSampleFilter(unittest.TestCase):
+    def record(self, level, lineno):
+        return logging.LogRecord("x", level, "x.py", lineno, "m", (), None)
+
+    def test_samples_debug_per_call_site(self):
+        sample = SampleFilter(every=3)
+        passed = [
+            sample.filter(self.record(logging.DEBUG, 1)) for _ in range(7)
+        ]
+        self.assertEqual(passed, [1, 0, 0, 1, 0, 0, 1])
+        self.assertTrue(sample.filter(self.record(logging.DEBUG, 2)))
+        self.assertTrue(
+            all(sample.filter(self.record(logging.INFO, 1)) for _ in range(5))
+        )
+
+
+class TestSetup(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        chatdb = logging.getLogger("mariusz.chatdb")
+
+        def restore():
+            root.handlers[:] = handlers
+            root.setLevel(level)
+            chatdb.setLevel(logging.NOTSET)
+
+        self.addCleanup(restore)
+
+    def test_writes_through_queue(self):
+        stream = io.StringIO()
+        listener = setup("WARNING,mariusz.chatdb=DEBUG", 1, stream)
+        logging.getLogger("mariusz.chatdb").debug("flushed %d chats", 3)
+        logging.getLogger("mariusz.other").info("not shown")
+        logging.getLogger("mariusz.other").warning("shown")
+        listener.stop()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(
+            lines[0].endswith(" D mariusz.chatdb: flushed 3 chats")
+        )
+        self.assertTrue(lines[1].endswith(" W mariusz.other: shown"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+import meetupscraper
+import telegram
+
+from . import fakes
+from .main import Mariusz
+from .meetup import MeetupRefresher
+from .sources import SharedSources
+from .watchdog import StallWatchdog
+from .wiki import WikiEntry
+
+CHAT_ID = -100123
+
+
+class FakeBot(fakes.FakeBot):
+    async def get_chat_member(self, chat_id, user_id):
+        return types.SimpleNamespace(status=telegram.ChatMember.OWNER)
+
+    def receive(self, update_id, text, chat_id=CHAT_ID):
+        return super().receive(update_id, text, chat_id)
+
+
+class UnpinnableBot(FakeBot):
+    """Can post in the chat, but not pin."""
+
+    def __init__(self):
+        super().__init__()
+        self.unpinned = []
+
+    async def unpin_chat_message(self, chat_id, message_id=None, **kwargs):
+        self.unpinned.append(message_id)
+        return await super().unpin_chat_message(**kwargs)
+
+    async def pin_chat_message(self, **kwargs):
+        raise telegram.error.BadRequest("Not enough rights to pin a message")
+
+
+class WebhookBot(FakeBot):
+    """Has a webhook left over from a previous run."""
+
+    def __init__(self):
+        super().__init__()
+        self.webhook = True
+        self.deleted_webhooks = 0
+
+    async def get_updates(self, offset=None, **kwargs):
+        if self.webhook:
+            raise telegram.error.Conflict("can't use getUpdates method")
+        return await super().get_updates(offset, **kwargs)
+
+    async def delete_webhook(self, **kwargs):
+        self.webhook = False
+        self.deleted_webhooks += 1
+        return True
+
+
+class FakeWatcher:
+    def __init__(self, entries):
+        self.entries = entries
+
+    async def poll(self):
+        return self.entries
+
+
+class TestMariusz(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.chat_db = os.path.join(self.tmpdir, "chats.sqlite")
+        self.bot = FakeBot()
+        self.sources = SharedSources()
+        self.addAsyncCleanup(self.sources.wiki.aclose)
+        self.sources.meetup_refresher = MeetupRefresher(fetch=lambda regex: [])
+
+    def mariusz(self, **kwargs):
+        return Mariusz(
+            "0:test",
+            self.chat_db,
+            None,
+            bot=self.bot,
+            sources=self.sources,
+            **kwargs,
+        )
+
+    async def wait_until(self, condition, timeout=5):
+        async with asyncio.timeout(timeout):
+            while not condition():
+                await asyncio.sleep(0.01)
+
+    def sent(self, text):
+        return [t for _, t in self.bot.sent if text in t]
+
+    async def test_czymamy_from_inventory(self):
+        dump = os.path.join(self.tmpdir, "dump.jsonl")
+        with open(dump, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": 1, "name": "Miarka zwijana"}) + "\n")
+        mariusz = self.mariusz(inventory_dump=dump)
+        running = asyncio.create_task(mariusz.run())
+        await self.wait_until(lambda: len(mariusz.inventory) == 1)
+        self.bot.receive(1, "czy mamy w hs miarkę?")
+        await self.wait_until(lambda: self.sent("Mamy:"))
+        self.assertIn("- Miarka zwijana", self.sent("Mamy:")[0])
+        mariusz.stop()
+        await running
+
+    async def test_announces_meetup_once_when_pinning_fails(self):
+        self.bot = UnpinnableBot()
+        upcoming = meetupscraper.Event(
+            url="https://meetup.com/e/1",
+            date=datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(days=2),
+            title="Hakierspejs",
+            venue=meetupscraper.Venue(name="Online event", street=""),
+        )
+        self.sources.meetup_refresher.fetch = lambda regex: [upcoming]
+        await self.sources.meetup_refresher.refresh()
+        mariusz = self.mariusz()
+        self.addCleanup(mariusz.chat_db.close)
+        mariusz.chat_db.insert(CHAT_ID, chat_type="supergroup")
+        mariusz.chat_db.set_pinned(CHAT_ID, "Stare ogłoszenie", 7)
+        with self.assertLogs("mariusz.broadcast"):
+            for _ in range(3):
+                await mariusz.maybe_update_meetup_message()
+        self.assertEqual(len(self.sent("https://meetup.com/e/1")), 1)
+        self.assertEqual(self.bot.unpinned, [7])
+
+    async def test_polling_deletes_leftover_webhook(self):
+        self.bot = WebhookBot()
+        mariusz = self.mariusz()
+        running = asyncio.create_task(mariusz.run())
+        self.bot.receive(1, ".wersja")
+        await self.wait_until(lambda: self.sent(mariusz.build_version))
+        mariusz.stop()
+        await running
+        self.assertEqual(self.bot.deleted_webhooks, 1)
+        self.assertEqual(self.sent("Bot umar"), [])
+
+    async def test_bots_share_the_stall_watchdog(self):
+        watchdog = StallWatchdog(threshold=0.05, interval=0.01)
+        watchdog.start()
+        self.addCleanup(watchdog.stop)
+        first = self.mariusz(watchdog=watchdog)
+        other_bot = FakeBot()
+        second = Mariusz(
+            "1:test",
+            os.path.join(self.tmpdir, "other.sqlite"),
+            None,
+            bot=other_bot,
+            sources=self.sources,
+            watchdog=watchdog,
+        )
+        running = [asyncio.create_task(m.run()) for m in (first, second)]
+        self.bot.receive(1, ".wersja")
+        other_bot.receive(1, ".wersja")
+        await self.wait_until(lambda: self.bot.sent and other_bot.sent)
+        watchdogs = [
+            t for t in threading.enumerate() if t.name == "stall-watchdog"
+        ]
+        self.assertEqual(len(watchdogs), 1)
+        with self.assertLogs("mariusz.watchdog", "WARNING") as logs:
+            time.sleep(0.2)
+            await asyncio.sleep(0.05)
+        self.assertEqual(len(logs.output), 1)
+        for mariusz in (first, second):
+            stalls = mariusz.metrics.render()
+            self.assertIn("mariusz_event_loop_stalls_total 1", stalls)
+            mariusz.stop()
+        await asyncio.gather(*running)
+        # Not theirs to stop.
+        self.assertTrue(all(thread.is_alive() for thread in watchdogs))
+
+    async def test_wiki_notifications(self):
+        self.sources.wiki = FakeWatcher(
+            [
+                WikiEntry("1", None, f"Strona-{i}", "ala", f"c{i}")
+                for i in range(2)
+            ]
+        )
+        mariusz = self.mariusz()
+        running = asyncio.create_task(mariusz.run())
+        self.bot.receive(1, "hej")  # the bot learns about the chat
+        await self.wait_until(lambda: mariusz.update_id == 2)
+        await self.sources.poll_wiki()
+        self.assertEqual(len(mariusz.outbox), 2)
+        self.assertIn("outbox", mariusz.scheduler.jobs)
+        mariusz.outbox.clock = lambda: time.time() + 3600  # all due
+        mariusz.stop()
+        await running
+        self.assertEqual(len(self.sent("Zmiany na wiki (2):")), 1)
+
+    async def test_throttles_autoresponses_only(self):
+        mariusz = self.mariusz(throttle_chat="1/60", throttle_user="10/60")
+        self.addCleanup(mariusz.chat_db.close)
+        for update_id, text in enumerate(["Łódź", "Lodz", ".wersja"] * 2):
+            await mariusz.process_update(self.bot.receive(update_id, text))
+        await mariusz.workers.join()
+        self.assertEqual(len(self.sent("youtube")), 1)
+        self.assertEqual(len(self.sent(mariusz.build_version)), 2)
+
+    async def test_profile_error_is_reported(self):
+        mariusz = self.mariusz(
+            main_chat_id=CHAT_ID,
+            profile_dir=os.path.join(self.tmpdir, "missing"),
+        )
+        self.addCleanup(mariusz.chat_db.close)
+        await mariusz.process_update(self.bot.receive(1, ".profil 1"))
+        await mariusz.workers.join()
+        with self.assertLogs("mariusz.main", "ERROR"):
+            await mariusz.profiling
+        self.assertEqual(len(self.sent("Profilowanie nie wyszło")), 1)
+        other = Mariusz("1:test", "", None, sources=self.sources)
+        self.assertIs(other.profiler, mariusz.profiler)
+
+    async def test_shutdown_saves_unfinished_updates(self):
+        mariusz = self.mariusz(main_chat_id=CHAT_ID)
+        mariusz.shutdown_timeout = 0.2
+        hanging = asyncio.Event()
+
+        async def hang(update):
+            hanging.set()
+            await asyncio.sleep(3600)
+
+        mariusz.on({"\\.wisi"}, hang)
+        running = asyncio.create_task(mariusz.run())
+        self.bot.receive(1, ".profil 300")
+        self.bot.receive(2, ".wisi")
+        async with asyncio.timeout(5):
+            await hanging.wait()
+        profiling = mariusz.profiling
+        mariusz.stop()
+        await running
+        self.assertTrue(profiling.cancelled())
+        self.assertFalse(mariusz.profiler.running)
+
+        db = sqlite3.connect(self.chat_db)
+        self.addCleanup(db.close)
+        self.assertEqual(
+            db.execute(
+                "SELECT value FROM state WHERE key = 'update_offset'"
+            ).fetchall(),
+            [(3,)],
+        )
+        self.assertEqual(
+            db.execute("SELECT update_id FROM unfinished_updates").fetchall(),
+            [(2,)],
+        )
+
+        # The next run handles it first.
+        mariusz = self.mariusz()
+        handled = []
+
+        async def record(update):
+            handled.append(update.update_id)
+
+        mariusz.on({"\\.wisi"}, record)
+        running = asyncio.create_task(mariusz.run())
+        await self.wait_until(lambda: handled)
+        mariusz.stop()
+        await running
+        self.assertEqual(handled, [2])
+        self.assertEqual(
+            db.execute("SELECT update_id FROM unfinished_updates").fetchall(),
+            [],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import asyncio
+import datetime
+import threading
+import unittest
+
+import meetupscraper
+from parameterized import parameterized
+
+from .meetup import (
+    MeetupFilter,
+    MeetupRefresher,
+    build_meetup_message,
+    seconds_until_change,
+)
+
+UTC = datetime.timezone.utc
+NOW = datetime.datetime(2024, 5, 6, 12, 0, tzinfo=UTC)
+
+
+def event(hours_from_now, name="Hakierspejs"):
+    return meetupscraper.Event(
+        url="https://meetup.com/e/" + str(hours_from_now),
+        date=NOW + datetime.timedelta(hours=hours_from_now),
+        title=name,
+        venue=meetupscraper.Venue(name="Online event", street=""),
+    )
+
+
+class TestBuildMeetupMessage(unittest.TestCase):
+    def test_picks_next_event(self):
+        message = build_meetup_message([event(48), event(24)], now=NOW)
+        self.assertEqual(
+            message,
+            "Nast. spotkanie: wtorek, 7 maja 2024 o godz 12:00 "
+            "(telekonferencja). Więcej szczegółów: https://meetup.com/e/24",
+        )
+
+    def test_soon(self):
+        message = build_meetup_message([event(2)], now=NOW)
+        self.assertTrue(message.startswith("Niedługo nast. spotkanie"))
+
+    def test_no_events(self):
+        self.assertEqual(build_meetup_message([event(-25)], now=NOW), "")
+
+    @parameterized.expand(
+        [
+            ("becomes soon", [event(5), event(48)], 2 * 3600),
+            ("moves on", [event(-2), event(48)], 22 * 3600),
+            ("soon and then moves on", [event(1)], 25 * 3600),
+            ("no change", [event(-25)], None),
+        ]
+    )
+    def test_seconds_until_change(self, _, events, expected):
+        delay = seconds_until_change(events, now=NOW)
+        self.assertEqual(delay, expected)
+        if delay is not None:
+            later = NOW + datetime.timedelta(seconds=delay + 1)
+            self.assertNotEqual(
+                build_meetup_message(events, now=NOW),
+                build_meetup_message(events, now=later),
+            )
+
+
+class FakeScraper:
+    def __init__(self):
+        self.now = 0.0
+        self.results = []
+        self.calls = 0
+
+    def clock(self):
+        return self.now
+
+    def fetch(self, group_regex):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class TestMeetupRefresher(unittest.IsolatedAsyncioTestCase):
+    async def settle(self, refresher):
+        if refresher._task is not None:
+            await refresher._task
+
+    async def test_stale_while_revalidate(self):
+        scraper = FakeScraper()
+        scraper.results = [[event(1)], [event(2)]]
+        refresher = MeetupRefresher(
+            ttl=100, fetch=scraper.fetch, clock=scraper.clock
+        )
+        self.assertIsNone(refresher.get())
+        await self.settle(refresher)
+        self.assertEqual(refresher.get(), [event(1)])
+
+        scraper.now = 150
+        self.assertEqual(refresher.get(), [event(1)])
+        await self.settle(refresher)
+        self.assertEqual(refresher.get(), [event(2)])
+        self.assertEqual(scraper.calls, 2)
+
+    async def test_backoff(self):
+        scraper = FakeScraper()
+        scraper.results = [RuntimeError(), RuntimeError(), [event(1)]]
+        refresher = MeetupRefresher(
+            min_backoff=10, fetch=scraper.fetch, clock=scraper.clock
+        )
+        with self.assertLogs("mariusz.meetup"):
+            refresher.get()
+            await self.settle(refresher)
+        self.assertEqual(refresher.retry_at, 10)
+
+        scraper.now = 5
+        refresher.get()
+        await asyncio.sleep(0)
+        self.assertEqual(scraper.calls, 1)
+
+        scraper.now = 10
+        with self.assertLogs("mariusz.meetup"):
+            refresher.get()
+            await self.settle(refresher)
+        self.assertEqual(refresher.retry_at, 30)
+
+        scraper.now = 30
+        refresher.get()
+        await self.settle(refresher)
+        self.assertEqual(refresher.get(), [event(1)])
+        self.assertEqual(refresher.failures, 0)
+
+    async def test_hanging_scrape_times_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        scraper = FakeScraper()
+        refresher = MeetupRefresher(
+            fetch=lambda regex: release.wait(),
+            timeout=0.05,
+            clock=scraper.clock,
+        )
+        with self.assertLogs("mariusz.meetup"):
+            refresher.get()
+            await self.settle(refresher)
+        self.assertEqual(refresher.failures, 1)
+        self.assertEqual(refresher.retry_at, 10)
+
+    async def test_filters_shared_scrape(self):
+        scraper = FakeScraper()
+        scraper.results = [[event(2, "Cryptoparty #7"), event(1)]]
+        refresher = MeetupRefresher(fetch=scraper.fetch, clock=scraper.clock)
+        crypto = MeetupFilter(refresher, "Cryptoparty")
+        everything = MeetupFilter(refresher)
+        self.assertIsNone(crypto.get())
+        await self.settle(refresher)
+        self.assertEqual(crypto.get(), [event(2, "Cryptoparty #7")])
+        self.assertEqual(
+            everything.get(), [event(1), event(2, "Cryptoparty #7")]
+        )
+        self.assertIs(crypto.get(), crypto.get())
+        self.assertEqual(scraper.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
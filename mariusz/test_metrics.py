@@ -0,0 +1,43 @@
+import unittest
+
+from .metrics import Registry
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        registry = Registry()
+        counter = registry.counter("x_total", "Things.")
+        counter.inc(result="sent")
+        counter.inc(2, result="sent")
+        histogram = registry.histogram("y_seconds", "Time.", (0.1, 1.0))
+        histogram.observe(0.05, reaction="^\\.czy")
+        histogram.observe(0.5, reaction="^\\.czy")
+        histogram.observe(5.0, reaction="^\\.czy")
+        registry.gauge("z", "Age.", lambda: [({"job": "wiki"}, 1.5)])
+        self.assertEqual(
+            registry.render(),
+            "# HELP x_total Things.\n"
+            "# TYPE x_total counter\n"
+            'x_total{result="sent"} 3\n'
+            "# HELP y_seconds Time.\n"
+            "# TYPE y_seconds histogram\n"
+            'y_seconds_bucket{reaction="^\\\\.czy",le="0.1"} 1\n'
+            'y_seconds_bucket{reaction="^\\\\.czy",le="1"} 2\n'
+            'y_seconds_bucket{reaction="^\\\\.czy",le="+Inf"} 3\n'
+            'y_seconds_sum{reaction="^\\\\.czy"} 5.55\n'
+            'y_seconds_count{reaction="^\\\\.czy"} 3\n'
+            "# HELP z Age.\n"
+            "# TYPE z gauge\n"
+            'z{job="wiki"} 1.5\n',
+        )
+
+    def test_quantile(self):
+        histogram = Registry().histogram("h", "H.", (0.1, 1.0))
+        for value in [0.05] * 95 + [0.5] * 5:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.95), 0.1)
+        self.assertEqual(histogram.quantile(0.99), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
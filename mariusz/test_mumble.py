@@ -0,0 +1,73 @@
+import asyncio
+import struct
+import unittest
+
+from .mumble import MumbleStatus, ping, ping_many
+
+
+class FakeMumble(asyncio.DatagramProtocol):
+    """Answers pings like a Mumble server, optionally ignoring the first
+    few of them."""
+
+    def __init__(self, drop=0):
+        self.drop = drop
+        self.pings = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.pings += 1
+        if self.pings <= self.drop:
+            return
+        reply = struct.pack(">I8sIII", 0x10204, data[4:12], 3, 100, 72000)
+        self.transport.sendto(reply, addr)
+
+
+class TestPing(unittest.IsolatedAsyncioTestCase):
+    async def serve(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: FakeMumble(**kwargs), local_addr=("127.0.0.1", 0)
+        )
+        self.addCleanup(transport.close)
+        return transport.get_extra_info("sockname")[1], protocol
+
+    async def test_reply(self):
+        port, _ = await self.serve()
+        status = await ping("127.0.0.1", port=port)
+        self.assertEqual(status, MumbleStatus(3, 100, 72000))
+
+    async def test_retries_lost_packets(self):
+        port, server = await self.serve(drop=2)
+        status = await ping("127.0.0.1", port=port, timeout=0.05, retries=3)
+        self.assertEqual(status.users, 3)
+        self.assertEqual(server.pings, 3)
+
+    async def test_timeout(self):
+        port, server = await self.serve(drop=10)
+        with self.assertLogs("mariusz.mumble"):
+            status = await ping(
+                "127.0.0.1", port=port, timeout=0.05, retries=2
+            )
+        self.assertIsNone(status)
+        self.assertEqual(server.pings, 2)
+
+    async def test_many(self):
+        port_a, server_a = await self.serve()
+        port_b, server_b = await self.serve(drop=10)
+        servers = [("127.0.0.1", port_a), ("127.0.0.1", port_b)]
+        with self.assertLogs("mariusz.mumble"):
+            statuses = await ping_many(servers, timeout=0.05, retries=1)
+        self.assertEqual(
+            statuses,
+            {
+                ("127.0.0.1", port_a): MumbleStatus(3, 100, 72000),
+                ("127.0.0.1", port_b): None,
+            },
+        )
+        self.assertEqual((server_a.pings, server_b.pings), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+
+from .broadcast import BroadcastReport, Delivery
+from .chatdb import ChatDb
+from .fakes import FakeClock
+from .outbox import Outbox, join, latest
+
+
+class FakeBroadcaster:
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    async def send_message(self, chat_ids, text):
+        deliveries = []
+        for chat_id in chat_ids:
+            if chat_id in self.failing:
+                deliveries.append(Delivery(chat_id, error=Exception("nope")))
+            else:
+                self.sent.append((chat_id, text))
+                deliveries.append(Delivery(chat_id))
+        return BroadcastReport(deliveries, 0.0)
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.fname = os.path.join(tmpdir.name, "chats.sqlite")
+        self.clock = FakeClock(1000.0)
+        self.broadcaster = FakeBroadcaster()
+        self.open()
+
+    def open(self):
+        self.chat_db = ChatDb(self.fname)
+        self.addCleanup(self.chat_db.close)
+        self.outbox = Outbox(
+            self.chat_db.db,
+            self.broadcaster,
+            combine={"wiki": join("Zmiany ({n}):"), "mumble": latest},
+            clock=self.clock,
+        )
+
+    async def test_coalesces_within_window(self):
+        self.outbox.put([1, 2], "wiki", "a", window=60)
+        self.clock.now += 30
+        self.outbox.put([1], "wiki", "b", window=60)
+        self.outbox.put([1], "mumble", "x", window=60)
+        self.assertEqual(await self.outbox.flush(), 0)
+        self.clock.now += 30
+        self.assertEqual(await self.outbox.flush(), 2)
+        self.assertEqual(
+            sorted(self.broadcaster.sent),
+            [(1, "Zmiany (2):\n\na\n\nb"), (2, "a")],
+        )
+        self.assertEqual(len(self.outbox), 1)
+        self.clock.now += 30
+        self.assertEqual(await self.outbox.flush(), 1)
+        self.assertEqual(self.broadcaster.sent[-1], (1, "x"))
+        self.assertEqual(len(self.outbox), 0)
+
+    async def test_join_limit(self):
+        combine = join("{n} zmian:", limit=2)
+        self.assertEqual(
+            combine(["a", "b", "c"]), "3 zmian:\n\na\n\nb\n\n…i jeszcze 1"
+        )
+        self.assertEqual(latest(["a", "b"]), "b")
+
+    async def test_drops_duplicates(self):
+        self.outbox.put([1], "mumble", "x", window=0)
+        self.outbox.put([1], "mumble", "x", window=0)
+        self.assertEqual(len(self.outbox), 1)
+        await self.outbox.flush()
+        self.outbox.put([1, 2], "mumble", "x", window=0)
+        await self.outbox.flush()
+        self.assertEqual(self.broadcaster.sent, [(1, "x"), (2, "x")])
+        self.assertEqual(self.outbox.duplicates, 1)
+        self.assertEqual(len(self.outbox), 0)
+
+    async def test_survives_restart(self):
+        self.outbox.put([1], "wiki", "a", window=60)
+        self.outbox.put([2], "mumble", "x", window=0)
+        await self.outbox.flush()
+        self.chat_db.close()
+        self.open()
+        self.clock.now += 60
+        self.outbox.put([2], "mumble", "x", window=0)
+        await self.outbox.flush()
+        self.assertEqual(self.broadcaster.sent, [(2, "x"), (1, "a")])
+
+    async def test_failed_deliveries_are_dropped(self):
+        self.broadcaster.failing.add(2)
+        self.outbox.put([1, 2], "wiki", "a", window=0)
+        with self.assertLogs("mariusz.outbox", "WARNING"):
+            self.assertEqual(await self.outbox.flush(), 1)
+        self.assertEqual(len(self.outbox), 0)
+        self.assertEqual(self.outbox.last_sent, {1: "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from .profiler import SamplingProfiler
+
+
+def busy_in_executor(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class TestSamplingProfiler(unittest.IsolatedAsyncioTestCase):
+    async def test_samples_executor_threads(self):
+        profiler = SamplingProfiler(interval=0.001)
+        loop = asyncio.get_running_loop()
+        busy = loop.run_in_executor(None, busy_in_executor, 0.3)
+        profile = await profiler.profile(0.2)
+        await busy
+        self.assertGreater(profile.samples, 10)
+        self.assertGreater(profile.idle(threading.main_thread().name), 0.5)
+        functions = [function for function, _, _ in profile.top(50)]
+        self.assertTrue(
+            any(f.startswith("busy_in_executor (") for f in functions)
+        )
+        line = next(
+            line
+            for line in profile.collapsed().splitlines()
+            if "busy_in_executor" in line
+        )
+        stack, count = line.rsplit(" ", 1)
+        self.assertFalse(stack.startswith("MainThread;"))
+        self.assertIn(";busy_in_executor (", stack)
+        self.assertGreater(int(count), 0)
+
+    async def test_one_at_a_time(self):
+        profiler = SamplingProfiler()
+        running = asyncio.create_task(profiler.profile(0.05))
+        await asyncio.sleep(0)
+        with self.assertRaises(RuntimeError):
+            await profiler.profile(0.05)
+        await running
+        self.assertFalse(profiler.running)
+
+
+if __name__ == "__main__":
+    unittest.main()
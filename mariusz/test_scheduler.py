@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from .scheduler import Scheduler
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = Scheduler()
+        self.task = asyncio.create_task(self.scheduler.run())
+        self.addCleanup(self.task.cancel)
+
+    async def test_periodic_and_once(self):
+        runs = []
+
+        async def tick():
+            runs.append("tick")
+
+        async def boom():
+            runs.append("boom")
+
+        self.scheduler.every(0.02, tick)
+        self.scheduler.once(0.03, boom)
+        await asyncio.sleep(0.09)
+        self.assertGreaterEqual(runs.count("tick"), 4)
+        self.assertEqual(runs.count("boom"), 1)
+        self.assertEqual([s["name"] for s in self.scheduler.stats()], ["tick"])
+
+    async def test_failure_and_timeout_are_isolated(self):
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        with self.assertLogs("mariusz.scheduler", "ERROR"):
+            self.scheduler.every(0.02, fail)
+            self.scheduler.every(0.02, hang, timeout=0.01)
+            await asyncio.sleep(0.05)
+        stats = {s["name"]: s for s in self.scheduler.stats()}
+        self.assertGreaterEqual(stats["fail"]["failures"], 2)
+        self.assertEqual(stats["fail"]["last_error"], "RuntimeError('boom')")
+        self.assertIn("timed out", stats["hang"]["last_error"])
+        self.assertFalse(self.task.done())
+
+    async def test_no_overlap(self):
+        running = []
+
+        async def slow():
+            running.append(1)
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(running), 1)
+            running.pop()
+
+        with self.assertLogs("mariusz.scheduler", "WARNING"):
+            job = self.scheduler.every(0.01, slow)
+            await asyncio.sleep(0.08)
+        self.assertGreater(job.skipped, 0)
+
+    async def test_cancel(self):
+        runs = []
+
+        async def tick():
+            runs.append(1)
+
+        self.scheduler.every(0.01, tick, delay=0.02)
+        self.scheduler.cancel("tick")
+        await asyncio.sleep(0.04)
+        self.assertEqual(runs, [])
+
+    async def test_join(self):
+        runs = []
+
+        async def slow():
+            await asyncio.sleep(0.03)
+            runs.append(1)
+
+        self.scheduler.once(0, slow)
+        await asyncio.sleep(0.01)
+        self.task.cancel()
+        await self.scheduler.join()
+        self.assertEqual(runs, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import unittest.mock
+
+from .mumble import MumbleStatus
+from .sources import SharedSources
+
+
+class FakeWatcher:
+    def __init__(self, entries):
+        self.entries = entries
+        self.polls = 0
+
+    async def poll(self):
+        self.polls += 1
+        return self.entries
+
+
+class Recorder:
+    def __init__(self):
+        self.wiki = []
+        self.mumble = []
+
+    def on_wiki_entries(self, entries):
+        self.wiki.append(entries)
+
+    def on_mumble_status(self, status):
+        self.mumble.append(status)
+
+
+class TestSharedSources(unittest.IsolatedAsyncioTestCase):
+    async def test_fans_out_one_poll(self):
+        sources = SharedSources()
+        sources.wiki = FakeWatcher(["entry"])
+        first, second = Recorder(), Recorder()
+        sources.subscribe(first)
+        sources.subscribe(second)
+        await sources.poll_wiki()
+        self.assertEqual(sources.wiki.polls, 1)
+        self.assertEqual(first.wiki, [["entry"]])
+        self.assertEqual(second.wiki, [["entry"]])
+
+        sources.wiki.entries = []
+        await sources.poll_wiki()
+        self.assertEqual(first.wiki, [["entry"]])
+
+    async def test_mumble(self):
+        sources = SharedSources()
+        status = MumbleStatus(users=2, max_users=10, bandwidth=1)
+        first = Recorder()
+        sources.subscribe(first)
+        with unittest.mock.patch("mariusz.mumble.ping", return_value=status):
+            await sources.poll_mumble()
+        self.assertEqual(first.mumble, [status])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from parameterized import parameterized
+
+from .fakes import FakeClock
+from .throttle import Throttle, parse_limit
+
+
+class TestThrottle(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.throttle = Throttle("2/60", "3/60", clock=self.clock)
+
+    def suppressed(self, **labels):
+        return self.throttle.suppressed.get(**labels)
+
+    @parameterized.expand(
+        [
+            ("3/60", (0.05, 3.0)),
+            ("1/0.5", (2.0, 1.0)),
+        ]
+    )
+    def test_parse_limit(self, spec, expected):
+        self.assertEqual(parse_limit(spec), expected)
+
+    @parameterized.expand([("0/60",), ("3/0",), ("3",)])
+    def test_parse_limit_invalid(self, spec):
+        with self.assertRaises(ValueError):
+            parse_limit(spec)
+
+    def test_per_chat_and_reaction(self):
+        allowed = [self.throttle.allow(1, None, "lodz") for _ in range(4)]
+        self.assertEqual(allowed, [True, True, False, False])
+        self.assertTrue(self.throttle.allow(1, None, "czy"))
+        self.assertTrue(self.throttle.allow(2, None, "lodz"))
+        self.assertEqual(self.suppressed(reaction="lodz", limit="chat"), 2)
+        self.clock.now += 30
+        self.assertTrue(self.throttle.allow(1, None, "lodz"))
+        self.assertFalse(self.throttle.allow(1, None, "lodz"))
+
+    def test_per_user(self):
+        allowed = [
+            self.throttle.allow(chat_id, 42, "lodz") for chat_id in range(5)
+        ]
+        self.assertEqual(allowed, [True, True, True, False, False])
+        self.assertTrue(self.throttle.allow(0, 43, "lodz"))
+        self.assertEqual(self.suppressed(reaction="lodz", limit="user"), 2)
+
+    def test_rejected_user_keeps_chat_tokens(self):
+        throttle = Throttle("3/60", "1/60", clock=self.clock)
+        self.assertTrue(throttle.allow(1, 42, "lodz"))
+        for _ in range(5):
+            self.assertFalse(throttle.allow(1, 42, "lodz"))
+        self.assertTrue(throttle.allow(1, 43, "lodz"))
+        self.assertTrue(throttle.allow(1, 44, "lodz"))
+
+    def test_evicts_least_recently_used(self):
+        throttle = Throttle("1/60", "100/60", max_keys=2, clock=self.clock)
+        self.assertTrue(throttle.allow(1, None, "a"))
+        self.assertTrue(throttle.allow(2, None, "a"))
+        self.assertFalse(throttle.allow(1, None, "a"))  # 1 is used again
+        self.assertTrue(throttle.allow(3, None, "a"))  # evicts 2
+        self.assertEqual(len(throttle.buckets), 2)
+        self.assertFalse(throttle.allow(1, None, "a"))
+        self.assertTrue(throttle.allow(2, None, "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
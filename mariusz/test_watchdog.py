@@ -0,0 +1,55 @@
+import asyncio
+import time
+import unittest
+
+from .metrics import Registry
+from .watchdog import StallWatchdog
+
+
+def blocking_callback():
+    time.sleep(0.3)
+
+
+class TestStallWatchdog(unittest.IsolatedAsyncioTestCase):
+    async def test_reports_blocking_code(self):
+        registry = Registry()
+        watchdog = StallWatchdog(registry, threshold=0.1, interval=0.02)
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            with self.assertLogs("mariusz.watchdog", "WARNING") as logs:
+                blocking_callback()
+                blocking_callback()  # same stall, reported once
+                await asyncio.sleep(0.05)
+        finally:
+            watchdog.stop()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("blocking_callback", logs.output[0])
+        self.assertIn("time.sleep(0.3)", logs.output[0])
+        self.assertEqual(watchdog.stalls.get(), 1)
+        self.assertGreater(watchdog.histogram.series[()].max, 0.5)
+
+    async def test_rate_limits_reports(self):
+        watchdog = StallWatchdog(threshold=0.05, interval=0.01)
+        watchdog.start()
+        try:
+            with self.assertLogs("mariusz.watchdog", "WARNING") as logs:
+                for _ in range(3):
+                    blocking_callback()
+                    await asyncio.sleep(0.05)
+        finally:
+            watchdog.stop()
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(watchdog.stalls.get(), 3)
+
+    async def test_quiet_when_idle(self):
+        watchdog = StallWatchdog(threshold=0.1, interval=0.02)
+        watchdog.start()
+        await asyncio.sleep(0.2)
+        watchdog.stop()
+        self.assertEqual(watchdog.stalls.get(), 0)
+        self.assertLess(watchdog.lag, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
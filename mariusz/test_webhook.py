@@ -0,0 +1,85 @@
+import json
+import unittest
+
+import httpx
+
+from .webhook import WebhookServer
+
+RECORDED_UPDATES = [
+    {
+        "update_id": 1000 + i,
+        "message": {
+            "message_id": 10 + i,
+            "date": 1700000000,
+            "chat": {"id": -100123, "type": "supergroup", "title": "HS"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Ala"},
+            "text": text,
+        },
+    }
+    for i, text in enumerate([".wersja", "Łódź", "czy mamy w hs miarkę?"])
+]
+
+
+class FakeBot:
+    def __init__(self):
+        self.webhooks = []
+
+    async def set_webhook(self, url, secret_token=None):
+        self.webhooks.append((url, secret_token))
+        return True
+
+
+class TestWebhookServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = FakeBot()
+        self.server = WebhookServer(
+            self.bot,
+            "https://bot.example.com/tg/hook",
+            port=0,
+            secret_token="s3cret",
+        )
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        self.client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{self.server.port}"
+        )
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def post(self, body, path="/tg/hook", secret="s3cret"):
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+        return await self.client.post(path, content=body, headers=headers)
+
+    async def test_registers_webhook(self):
+        self.assertEqual(
+            self.bot.webhooks, [("https://bot.example.com/tg/hook", "s3cret")]
+        )
+
+    async def test_replays_recorded_updates(self):
+        for update in RECORDED_UPDATES:
+            response = await self.post(json.dumps(update))
+            self.assertEqual(response.status_code, 200)
+        updates = await self.server.get_updates(timeout=1)
+        self.assertEqual([u.update_id for u in updates], [1000, 1001, 1002])
+        self.assertEqual(updates[1].message.text, "Łódź")
+        self.assertEqual(updates[1].message.chat_id, -100123)
+
+    async def test_take_queued_after_stop(self):
+        for update in RECORDED_UPDATES[:2]:
+            await self.post(json.dumps(update))
+        await self.server.stop()
+        updates = self.server.take_queued()
+        self.assertEqual([u.update_id for u in updates], [1000, 1001])
+        self.assertEqual(self.server.take_queued(), [])
+
+    async def test_rejects_bad_requests(self):
+        body = json.dumps(RECORDED_UPDATES[0])
+        self.assertEqual((await self.post(body, secret="x")).status_code, 403)
+        self.assertEqual((await self.post(body, path="/")).status_code, 404)
+        self.assertEqual((await self.post("{")).status_code, 400)
+        response = await self.client.get("/tg/hook")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(await self.server.get_updates(timeout=0.01), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from . import httpd
+from .wiki import WikiWatcher, build_wiki_message
+
+
+def atom_entry(commit, page, updated, author="ala"):
+    return f"""
+  <entry>
+    <id>tag:github.com,2008:Grit::Commit/{commit}</id>
+    <link type="text/html" rel="alternate"
+          href="https://github.com/hakierspejs/wiki/wiki/{page}"/>
+    <title>{page}</title>
+    <updated>{updated}</updated>
+    <author><name>{author}</name></author>
+  </entry>"""
+
+
+def atom_feed(entries):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        "<title>Recent updates to the hakierspejs/wiki wiki</title>"
+        + "".join(atom_entry(*e) for e in entries)
+        + "</feed>"
+    ).encode()
+
+
+class FakeGithub:
+    """Serves a feed and honours If-None-Match like GitHub does."""
+
+    def __init__(self):
+        self.entries = []
+        self.requests = []
+        self.broken = False
+
+    async def handle(self, request):
+        self.requests.append(request)
+        if self.broken:
+            return httpd.Response(body=b"<feed><entry>")
+        etag = f'"{len(self.entries)}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpd.Response(304)
+        return httpd.Response(
+            body=atom_feed(self.entries),
+            content_type="application/atom+xml",
+            headers=(("ETag", etag),),
+        )
+
+
+class TestWikiWatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.github = FakeGithub()
+        server = await httpd.serve(self.github.handle, "127.0.0.1", 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        port = server.sockets[0].getsockname()[1]
+        self.watcher = WikiWatcher(f"http://127.0.0.1:{port}/wiki.atom")
+        self.addAsyncCleanup(self.watcher.aclose)
+
+    def add(self, commit, page, updated):
+        self.github.entries.insert(0, (commit, page, updated))
+
+    async def test_reports_every_new_entry(self):
+        self.add("a1", "Home", "2024-01-01T10:00:00Z")
+        self.assertEqual(await self.watcher.poll(), [])
+        self.assertEqual(await self.watcher.poll(), [])
+        self.assertEqual(
+            self.github.requests[-1].headers["if-none-match"], '"1"'
+        )
+
+        self.add("b2", "Projekty", "2024-01-02T10:00:00Z")
+        self.add("c3", "Spotkania-2024", "2024-01-02T11:00:00+01:00")
+        entries = await self.watcher.poll()
+        self.assertEqual([e.commit for e in entries], ["b2", "c3"])
+        self.assertEqual(
+            build_wiki_message(entries[1]),
+            'Wiki: ala zmienił(a) "Spotkania 2024".\n\n'
+            "Sprawdź zmianę tutaj: https://github.com/hakierspejs/wiki/wiki/"
+            "Spotkania-2024/_compare/c3%5E...c3",
+        )
+        self.assertEqual(await self.watcher.poll(), [])
+
+    async def test_malformed_feed(self):
+        self.github.broken = True
+        with self.assertLogs("mariusz.wiki"):
+            self.assertEqual(await self.watcher.poll(), [])
+        self.assertIsNone(self.watcher.etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
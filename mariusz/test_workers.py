@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from .workers import ChatWorkers
+
+
+class TestChatWorkers(unittest.IsolatedAsyncioTestCase):
+    async def test_order_within_chat(self):
+        workers = ChatWorkers()
+        done = []
+
+        def job(key, n, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                done.append((key, n))
+
+            return run
+
+        await workers.submit("a", job("a", 1, 0.03))
+        await workers.submit("b", job("b", 1, 0.01))
+        await workers.submit("a", job("a", 2, 0.0))
+        await workers.submit("b", job("b", 2, 0.0))
+        await workers.join()
+        self.assertEqual(done, [("b", 1), ("b", 2), ("a", 1), ("a", 2)])
+        self.assertEqual(workers.queues, {})
+
+    async def test_backpressure(self):
+        workers = ChatWorkers(max_in_flight=2)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        await workers.submit(1, blocked)
+        await workers.submit(2, blocked)
+        third = asyncio.create_task(workers.submit(3, blocked))
+        await asyncio.sleep(0.01)
+        self.assertFalse(third.done())
+        self.assertEqual(workers.in_flight, 2)
+
+        release.set()
+        await third
+        await workers.join()
+        self.assertEqual(workers.in_flight, 0)
+
+    async def test_failure_is_isolated(self):
+        workers = ChatWorkers()
+        done = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def ok():
+            done.append(True)
+
+        with self.assertLogs("mariusz.workers"):
+            await workers.submit(1, fail)
+            await workers.submit(1, ok)
+            await workers.join()
+        self.assertEqual(done, [True])
+
+    async def test_cancel(self):
+        workers = ChatWorkers()
+        done = []
+
+        async def hang():
+            await asyncio.sleep(10)
+            done.append("hang")
+
+        async def ok():
+            done.append("ok")
+
+        await workers.submit(1, hang)
+        await workers.submit(1, ok)
+        await workers.submit(2, hang)
+        await asyncio.sleep(0)
+        workers.cancel()
+        await workers.join()
+        self.assertEqual(done, [])
+        self.assertEqual(workers.queues, {})
+        self.assertEqual(workers.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
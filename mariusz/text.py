@@ -0,0 +1,79 @@
+"""Helpers for matching Polish text regardless of diacritics and
+inflection."""
+
+import re
+
+POLISH_TO_LATIN = {
+    "ą": "a",
+    "Ą": "A",
+    "ć": "c",
+    "Ć": "C",
+    "ę": "e",
+    "Ę": "E",
+    "ł": "l",
+    "Ł": "L",
+    "ń": "n",
+    "Ń": "N",
+    "ó": "o",
+    "Ó": "O",
+    "ś": "s",
+    "Ś": "S",
+    "ź": "z",
+    "Ź": "Z",
+    "ż": "z",
+    "Ż": "Z",
+}
+
+_FOLD = str.maketrans(
+    {k: v for k, v in POLISH_TO_LATIN.items() if k.islower()}
+)
+_STRIP = str.maketrans(POLISH_TO_LATIN)
+
+# Common endings of Polish nouns and adjectives (after removing
+# diacritics), longest first. Good enough to make "miarkę", "miarki" and
+# "miarka" meet at "miark"; not a real stemmer.
+_SUFFIXES = (
+    "ami",
+    "ach",
+    "owi",
+    "ego",
+    "emu",
+    "ow",
+    "om",
+    "em",
+    "ie",
+    "a",
+    "e",
+    "i",
+    "o",
+    "u",
+    "y",
+)
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercases the text and replaces Polish letters with their Latin
+    counterparts, e.g. "Łódź" -> "lodz"."""
+    return text.lower().translate(_FOLD)
+
+
+def strip_diacritics(text: str) -> str:
+    """Replaces Polish letters with their Latin counterparts, keeping the
+    case, e.g. "Łódź" -> "Lodz"."""
+    return text.translate(_STRIP)
+
+
+def stem(word: str) -> str:
+    """Cuts off the inflection ending of a lowercase, diacritic-free word,
+    leaving at least three letters."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def search_terms(text: str) -> list[str]:
+    """Splits the text into lowercase, diacritic-free, stemmed words."""
+    return [stem(word) for word in _WORD.findall(fold(text))]
@@ -0,0 +1,97 @@
+"""Limits how often the bot reacts, so that somebody spamming a trigger
+doesn't use up the Telegram rate limits we share with broadcasts."""
+
+import collections
+import logging
+import time
+from typing import Callable, Hashable
+
+import mariusz.broadcast
+import mariusz.metrics
+
+LOGGER = logging.getLogger(__name__)
+
+# Reactions: at most 3 replies to the same trigger in a chat per minute,
+# and 5 replies to a single user per minute.
+CHAT_LIMIT = "3/60"
+USER_LIMIT = "5/60"
+
+
+def parse_limit(spec: str) -> tuple[float, float]:
+    """Parses "N/S" (N reactions per S seconds) into (rate, burst). The
+    first N reactions go through at once; after that one more is allowed
+    every S/N seconds."""
+    count, _, seconds = spec.partition("/")
+    burst = float(count)
+    if burst <= 0 or float(seconds) <= 0:
+        raise ValueError(f"Invalid limit: {spec!r}")
+    return burst / float(seconds), burst
+
+
+class Throttle:
+    """Token buckets for each (chat, reaction) and for each user. A
+    reaction is allowed when both of its buckets have a token.
+
+    Only the `max_keys` most recently used buckets are kept; a bucket that
+    was evicted starts over full, which it would have been by then anyway
+    unless `max_keys` is too small."""
+
+    def __init__(
+        self,
+        chat_limit: str = CHAT_LIMIT,
+        user_limit: str = USER_LIMIT,
+        max_keys: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: mariusz.metrics.Registry | None = None,
+    ) -> None:
+        self.chat_rate, self.chat_burst = parse_limit(chat_limit)
+        self.user_rate, self.user_burst = parse_limit(user_limit)
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets: collections.OrderedDict[
+            Hashable, mariusz.broadcast.TokenBucket
+        ] = collections.OrderedDict()
+        metrics = metrics or mariusz.metrics.Registry()
+        self.suppressed = metrics.counter(
+            "mariusz_reactions_throttled_total",
+            "Reactions dropped because a chat or a user hit the limit.",
+        )
+
+    def _bucket(
+        self, key: Hashable, rate: float, burst: float
+    ) -> mariusz.broadcast.TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = mariusz.broadcast.TokenBucket(
+                rate, capacity=burst, clock=self.clock
+            )
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, chat_id: int, user_id: int | None, reaction: str) -> bool:
+        """Takes a token for the reaction in the chat and one for the user
+        (if known). Returns False, and counts the reaction as suppressed,
+        if either of them ran out; then neither token is taken."""
+        chat_bucket = self._bucket(
+            ("chat", chat_id, reaction), self.chat_rate, self.chat_burst
+        )
+        if chat_bucket.try_take():
+            self.suppressed.inc(reaction=reaction, limit="chat")
+            LOGGER.debug("Throttle: %r in chat %d", reaction, chat_id)
+            return False
+        if user_id is None:
+            return True
+        user_bucket = self._bucket(
+            ("user", user_id), self.user_rate, self.user_burst
+        )
+        if user_bucket.try_take():
+            # A flooder shouldn't use up the chat's replies for others.
+            chat_bucket.refund()
+            self.suppressed.inc(reaction=reaction, limit="user")
+            LOGGER.debug("Throttle: %r from user %d", reaction, user_id)
+            return False
+        return True
@@ -0,0 +1,25 @@
+"""Describes the version of the bot that's running."""
+
+import functools
+import subprocess
+
+
+def _git(*args: str) -> str:
+    return subprocess.check_output(["git", *args], text=True).strip()
+
+
+@functools.cache
+def describe() -> str:
+    """Returns e.g. "1a2b3c (#123, 2024-01-01 12:00:00 +0100)". Docker
+    images have it baked into mariusz/_build_info.py; otherwise it's read
+    from the git repository, once per process."""
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        from mariusz._build_info import DESCRIPTION  # type: ignore
+
+        return DESCRIPTION
+    except ImportError:
+        pass
+    commit, date = _git("show", "-s", "--format=%H%n%ci", "HEAD").split("\n")
+    number = _git("rev-list", "--count", "HEAD")
+    return f"{commit[:6]} (#{number}, {date})"
@@ -0,0 +1,116 @@
+"""Detects callbacks that block the event loop and shows what they were
+doing at the time."""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import mariusz.metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StallWatchdog:
+    """Measures event loop lag continuously and catches stalls.
+
+    A heartbeat callback runs on the loop every `interval` seconds and
+    records how late it was. A separate thread checks the heartbeat; when
+    the loop hasn't run it for `threshold` seconds, the thread captures the
+    loop thread's current stack and logs it. Reports are rate-limited to one
+    per `report_interval` seconds. This is much cheaper than running the
+    whole process in asyncio debug mode."""
+
+    def __init__(
+        self,
+        registry: mariusz.metrics.Registry | None = None,
+        threshold: float = 0.5,
+        interval: float = 0.1,
+        report_interval: float = 60.0,
+    ) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+        registry = registry or mariusz.metrics.Registry()
+        self.histogram = registry.histogram(
+            "mariusz_event_loop_lag_seconds",
+            "How late the event loop runs scheduled callbacks.",
+        )
+        self.stalls = registry.counter(
+            "mariusz_event_loop_stalls_total",
+            "How many times the event loop was blocked for too long.",
+        )
+        self.lag = 0.0
+        self.last_beat = 0.0
+        self.last_report = -report_interval
+        self.reports: list[str] = []
+        self._expected = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._handle: asyncio.TimerHandle | None = None
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(self, registry: mariusz.metrics.Registry) -> None:
+        """Also exposes the lag and the stalls in `registry`, for bots that
+        share the watchdog with the one that created it."""
+        registry.register(self.histogram)
+        registry.register(self.stalls)
+
+    def start(self) -> None:
+        """Starts watching the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self.last_beat = self._expected = time.monotonic()
+        self._handle = self._loop.call_soon(self._beat)
+        self._thread = threading.Thread(
+            target=self._watch, name="stall-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops watching."""
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        self.lag = max(now - self._expected, 0.0)
+        self.histogram.observe(self.lag)
+        self.last_beat = now
+        self._expected = now + self.interval
+        assert self._loop is not None
+        self._handle = self._loop.call_at(
+            self._loop.time() + self.interval, self._beat
+        )
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval / 2):
+            beat = self.last_beat
+            blocked_for = time.monotonic() - beat
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # report every stall only once
+            self.stalls.inc()
+            now = time.monotonic()
+            if now - self.last_report < self.report_interval:
+                continue
+            self.last_report = now
+            frame = sys._current_frames().get(  # pylint: disable=W0212
+                self._loop_thread_id
+            )
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            self.reports = (self.reports + [stack])[-10:]
+            LOGGER.warning(
+                "Event loop blocked for %.3fs, currently at:\n%s",
+                blocked_for,
+                stack,
+            )
@@ -0,0 +1,105 @@
+"""Receives Telegram updates pushed to us over a webhook, as an alternative
+to long polling with getUpdates."""
+
+import asyncio
+import hmac
+import json
+import logging
+
+import telegram
+
+import mariusz.httpd
+
+LOGGER = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class WebhookServer:
+    """Listens for updates POSTed by Telegram and queues them up for the
+    bot's dispatcher. `url` is the public address that Telegram should use
+    (e.g. behind a reverse proxy), `host` and `port` are where we listen."""
+
+    def __init__(
+        self,
+        bot: telegram.Bot,
+        url: str,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        secret_token: str | None = None,
+        max_queue: int = 1000,
+    ) -> None:
+        self.bot = bot
+        self.url = url
+        self.host = host
+        self.port = port
+        self.secret_token = secret_token
+        self.path = "/" + url.split("://", 1)[-1].partition("/")[2]
+        self.queue: asyncio.Queue[telegram.Update] = asyncio.Queue(max_queue)
+        self.server: asyncio.Server | None = None
+
+    async def start(self, register: bool = True) -> None:
+        """Starts listening and, unless `register` is False, tells Telegram
+        to send updates to us."""
+        self.server = await mariusz.httpd.serve(
+            self.handle, self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        LOGGER.info("WebhookServer: listening on %s:%d", self.host, self.port)
+        if register:
+            await self.bot.set_webhook(
+                url=self.url, secret_token=self.secret_token
+            )
+
+    async def stop(self) -> None:
+        """Stops accepting new updates. The webhook stays registered, so
+        Telegram keeps them for us until we're back."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(
+        self, request: mariusz.httpd.Request
+    ) -> mariusz.httpd.Response:
+        """Accepts a single update."""
+        if request.path != self.path:
+            return mariusz.httpd.Response(404)
+        if request.method != "POST":
+            return mariusz.httpd.Response(405)
+        if self.secret_token is not None and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return mariusz.httpd.Response(403)
+        try:
+            update = telegram.Update.de_json(
+                json.loads(request.body), self.bot
+            )
+        except (ValueError, TypeError, KeyError):
+            LOGGER.warning("WebhookServer: malformed update")
+            return mariusz.httpd.Response(400)
+        if update is None:
+            return mariusz.httpd.Response(400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram will retry the delivery later.
+            return mariusz.httpd.Response(503)
+        return mariusz.httpd.Response(200)
+
+    async def get_updates(self, timeout: float) -> list[telegram.Update]:
+        """Same contract as Bot.get_updates with a long-polling timeout:
+        waits up to `timeout` seconds for at least one update and returns
+        everything that's queued."""
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return [first] + self.take_queued()
+
+    def take_queued(self) -> list[telegram.Update]:
+        """Returns the updates that were accepted but not handed out yet."""
+        updates = []
+        while not self.queue.empty():
+            updates.append(self.queue.get_nowait())
+        return updates
@@ -1,50 +1,157 @@
 """Common functions used by our bot in order to process Github wikis."""
 
+import asyncio
+import datetime
+import functools
+import io
+import logging
 import urllib.parse
+from typing import NamedTuple
 
-import dateutil.parser
-import lxml.etree as E
 import httpx
 
+LOGGER = logging.getLogger(__name__)
+
 NS = "{http://www.w3.org/2005/Atom}"
+WIKI_URL = "https://github.com/hakierspejs/wiki/wiki.atom"
+BASE_URL = "https://github.com/hakierspejs/wiki/wiki"
 
 
-async def get_wiki_entries(url: str):
-    """Returns all Wiki entries for a given URL."""
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, timeout=10)
-        r.raise_for_status()
-        text = r.text.encode()
-    tree = E.fromstring(text)
-    entry_f = E.ETXPath(NS + "entry")
-    entries = entry_f(tree)
-    updated_f = E.ETXPath(".//" + NS + "updated/text()")
-    entries.sort(key=lambda e: dateutil.parser.parse(updated_f(e)[0]))
+@functools.cache
+def _etree():
+    # lxml is only needed once the first feed arrives, so it isn't
+    # imported at startup.
+    import lxml.etree  # pylint: disable=import-outside-toplevel
+
+    return lxml.etree
+
+
+@functools.cache
+def _xpath(path: str):
+    # Compiled once; they're evaluated against a single <entry> element.
+    return _etree().ETXPath(NS + path)
+
+
+class WikiEntry(NamedTuple):
+    """A single change in the wiki's history."""
+
+    id: str
+    updated: datetime.datetime
+    title: str
+    author: str
+    commit: str
+
+
+def parse_entry(entry) -> WikiEntry:
+    """Extracts what we need from an Atom <entry> element."""
+    entry_id = _xpath("id/text()")(entry)[0]
+    href = _xpath("link/@href")(entry)[0]
+    title = href.split("/hakierspejs/wiki/wiki")[1] or "Home"
+    return WikiEntry(
+        id=entry_id,
+        updated=datetime.datetime.fromisoformat(
+            _xpath("updated/text()")(entry)[0]
+        ),
+        title=urllib.parse.unquote(title.lstrip("/")),
+        author=_xpath("author/*/text()")(entry)[0],
+        commit=entry_id.split("/")[-1],
+    )
+
+
+def parse_new_entries(
+    feed: bytes, last: WikiEntry | None, limit: int = 20
+) -> list[WikiEntry]:
+    """Returns entries newer than `last`, oldest first. The feed lists the
+    newest entries first, so parsing stops at the first entry we've already
+    seen; without `last`, only the newest entry is parsed."""
+    if last is None:
+        limit = 1
+    entries: list[WikiEntry] = []
+    for _, element in _etree().iterparse(io.BytesIO(feed), tag=NS + "entry"):
+        entry = parse_entry(element)
+        element.clear()
+        if last is not None and (
+            entry.id == last.id or entry.updated < last.updated
+        ):
+            break
+        entries.append(entry)
+        if len(entries) >= limit:
+            break
+    entries.reverse()
     return entries
 
 
-async def build_wiki_message() -> str:
-    """Builds a message describing the current state of the wiki."""
-    wiki_url = "https://github.com/hakierspejs/wiki/wiki.atom"
-    try:
-        entries = await get_wiki_entries(wiki_url)
-        if not entries:
-            return ""
-        latest = entries.pop()
-    except E.XMLSyntaxError:
-        return ""
-    title_raw = E.ETXPath(".//" + NS + "link/@href")(latest)[0]
-    title = title_raw.split("/hakierspejs/wiki/wiki")[1] or "Home"
-    title = urllib.parse.unquote(title.lstrip("/"))
-    author = E.ETXPath(".//" + NS + "author/*/text()")(latest)[0]
-    commit = E.ETXPath(".//" + NS + "id/text()")(latest)[0].split("/")[-1]
-    base_url = "https://github.com/hakierspejs/wiki/wiki"
-    url = base_url + f"/{title}/_compare/{commit}%5E...{commit}"
+def build_wiki_message(entry: WikiEntry) -> str:
+    """Builds a message describing a change in the wiki."""
+    commit = entry.commit
+    url = BASE_URL + f"/{entry.title}/_compare/{commit}%5E...{commit}"
     return (
-        f'Wiki: {author} zmienił(a) "{title.replace("-", " ")}".\n\n'
-        f"Sprawdź zmianę tutaj: {url}"
+        f'Wiki: {entry.author} zmienił(a) "{entry.title.replace("-", " ")}".'
+        f"\n\nSprawdź zmianę tutaj: {url}"
     )
 
 
+class WikiWatcher:
+    """Polls the wiki's Atom feed over a single pooled connection. Uses
+    conditional requests, so when nothing changed GitHub answers with a 304
+    and we don't parse anything."""
+
+    def __init__(
+        self,
+        url: str = WIKI_URL,
+        timeout: float = 10.0,
+        client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.url = url
+        self.timeout = timeout
+        # Created on the first poll: setting up TLS takes a while and
+        # shouldn't delay startup.
+        self.client = client
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.last: WikiEntry | None = None
+
+    async def poll(self) -> list[WikiEntry]:
+        """Returns the entries added since the previous poll, oldest first.
+        The first poll only remembers where the history ends."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+        r = await self.client.get(self.url, headers=headers)
+        if r.status_code == httpx.codes.NOT_MODIFIED:
+            return []
+        r.raise_for_status()
+        try:
+            entries = parse_new_entries(r.content, self.last)
+        except _etree().XMLSyntaxError as e:
+            LOGGER.warning("WikiWatcher: %r", e)
+            return []
+        # Only remember the validators once the body was parsed correctly.
+        self.etag = r.headers.get("ETag")
+        self.last_modified = r.headers.get("Last-Modified")
+        if not entries:
+            return []
+        first_poll = self.last is None
+        self.last = entries[-1]
+        return [] if first_poll else entries
+
+    async def aclose(self) -> None:
+        """Closes the underlying connection pool."""
+        if self.client is not None:
+            await self.client.aclose()
+
+
+async def _print_latest() -> None:
+    watcher = WikiWatcher()
+    await watcher.poll()
+    if watcher.last:
+        print(build_wiki_message(watcher.last))
+    await watcher.aclose()
+
+
 if __name__ == "__main__":
-    print(build_wiki_message())
+    asyncio.run(_print_latest())
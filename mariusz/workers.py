@@ -0,0 +1,69 @@
+"""Runs jobs for different chats concurrently while keeping the order of
+jobs within each chat."""
+
+import asyncio
+import collections
+import logging
+from typing import Awaitable, Callable, Hashable
+
+LOGGER = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class ChatWorkers:
+    """A pool of per-key workers. Jobs submitted under the same key (a chat
+    ID) run one after another in submission order; jobs under different
+    keys run concurrently. At most `max_in_flight` jobs may be queued or
+    running at once; submit() waits for a free slot, which pushes back on
+    whoever produces the jobs."""
+
+    def __init__(self, max_in_flight: int = 64) -> None:
+        self.max_in_flight = max_in_flight
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.queues: dict[Hashable, collections.deque[Job]] = {}
+        self.tasks: set[asyncio.Task[None]] = set()
+        self.in_flight = 0
+
+    async def submit(self, key: Hashable, job: Job) -> None:
+        """Schedules the job to run after all the previously submitted jobs
+        with the same key."""
+        await self.slots.acquire()
+        self.in_flight += 1
+        queue = self.queues.get(key)
+        if queue is not None:
+            queue.append(job)
+            return
+        self.queues[key] = collections.deque([job])
+        task = asyncio.create_task(self._work(key))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _work(self, key: Hashable) -> None:
+        queue = self.queues[key]
+        try:
+            while queue:
+                job = queue.popleft()
+                try:
+                    await job()
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("ChatWorkers: job for %r failed", key)
+                finally:
+                    self.in_flight -= 1
+                    self.slots.release()
+        finally:
+            # Jobs that never ran because the worker was cancelled.
+            self.in_flight -= len(queue)
+            for _ in queue:
+                self.slots.release()
+            del self.queues[key]
+
+    def cancel(self) -> None:
+        """Interrupts the running jobs and drops the queued ones."""
+        for task in self.tasks:
+            task.cancel()
+
+    async def join(self) -> None:
+        """Waits until all the submitted jobs are done."""
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)